@@ -1,20 +1,33 @@
+import atexit
 import os
 import time
 import random
-import psutil
-from datetime import datetime
+from datetime import datetime, timezone
 from flask import Flask, request, jsonify
 import logging
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datadog import initialize, statsd
 from ddtrace import tracer, patch_all
 
+from db_pool import ConnectionPool
+from ingest import MetricIngestBuffer, parse_points, parse_timestamp
+from load_kernels import run_load
+from log_pipeline import setup_logging
+from metrics import MetricAggregator
+from rollups import SCHEMA as ROLLUP_SCHEMA, RollupJob, query_series
+from system_sampler import SystemSampler
+
 # Initialize Datadog tracing
 patch_all()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Request metrics are aggregated in process and flushed to the agent every
+# METRICS_FLUSH_INTERVAL_SECONDS (see metrics.py) instead of one UDP packet
+# per metric per request
+request_metrics = MetricAggregator()
+
+# Configure logging: JSON lines written by a background thread, with
+# success-path logs sampled at LOG_SAMPLE_RATE (see log_pipeline.py)
+setup_logging(dropped_counter=request_metrics.counter('flask_app.logs.dropped', ('level',)))
 logger = logging.getLogger(__name__)
 
 # Initialize Flask app
@@ -27,25 +40,20 @@ options = {
 }
 initialize(**options)
 
-# Database connection helper
-def get_db_connection():
-    """Get database connection"""
-    try:
-        conn = psycopg2.connect(
-            os.getenv('DATABASE_URL'),
-            cursor_factory=RealDictCursor
-        )
-        return conn
-    except Exception as e:
-        logger.error(f"Database connection failed: {e}")
-        return None
+# Database connection pool (see db_pool.py); requests borrow an open
+# connection instead of connecting to Postgres every time
+db_pool = ConnectionPool(
+    os.getenv('DATABASE_URL'),
+    metric_prefix='flask_app.db_pool',
+    cursor_factory=RealDictCursor
+)
+db_pool.start()
 
 # Initialize database (create simple table)
 def init_db():
     """Create simple metrics table if it doesn't exist"""
     try:
-        conn = get_db_connection()
-        if conn:
+        with db_pool.connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     CREATE TABLE IF NOT EXISTS simple_metrics (
@@ -56,11 +64,15 @@ def init_db():
                     )
                 """)
                 
+                # Index and rollup tables for /api/metrics/query (see rollups.py)
+                for statement in ROLLUP_SCHEMA:
+                    cur.execute(statement)
+                
                 # Insert some sample data if table is empty
-                cur.execute("SELECT COUNT(*) FROM simple_metrics")
-                count = cur.fetchone()['count']
+                cur.execute("SELECT EXISTS (SELECT 1 FROM simple_metrics) AS has_rows")
+                has_rows = cur.fetchone()['has_rows']
                 
-                if count == 0:
+                if not has_rows:
                     sample_data = [
                         ('cpu_usage', 45.2),
                         ('memory_usage', 67.8),
@@ -73,40 +85,58 @@ def init_db():
                         )
                 
             conn.commit()
-            conn.close()
             logger.info("Database initialized successfully")
     except Exception as e:
-        logger.error(f"Database initialization failed: {e}")
+        logger.error("Database initialization failed: %s", e)
 
 # Initialize database on startup
 init_db()
 
-# Middleware for request logging and metrics
+# Middleware metrics, declared once with their tag names
+requests_count = request_metrics.counter('flask_app.requests.count', ('endpoint', 'method'))
+responses_count = request_metrics.counter('flask_app.responses.count', ('endpoint', 'method', 'status'))
+response_time_seconds = request_metrics.histogram('flask_app.response_time', ('endpoint', 'method', 'status'))
+request_metrics.start()
+
+def request_started(endpoint, method):
+    """Count a new request and return its start time"""
+    requests_count.increment(endpoint, method)
+    return time.time()
+
+def request_finished(endpoint, method, path, status_code, start_time):
+    """Log the request line and record its metrics for the next flush"""
+    response_time = time.time() - start_time
+    
+    logger.info("%s %s - %s - %.3fs", method, path, status_code, response_time,
+                extra={'sampled': status_code < 400})
+    
+    response_time_seconds.record(response_time, endpoint, method, status_code)
+    responses_count.increment(endpoint, method, status_code)
+
+# Middleware for request logging and metrics; asgi.py calls the same
+# helpers for the routes it serves itself
 @app.before_request
 def before_request():
-    request.start_time = time.time()
-    
-    # Custom metric: increment request counter
-    statsd.increment('flask_app.requests.count', 
-                    tags=[f'endpoint:{request.endpoint}', f'method:{request.method}'])
+    request.start_time = request_started(request.endpoint, request.method)
 
 @app.after_request
 def after_request(response):
-    # Calculate response time
-    response_time = time.time() - request.start_time
-    
-    # Log request
-    logger.info(f"{request.method} {request.path} - {response.status_code} - {response_time:.3f}s")
-    
-    # Send metrics to Datadog
-    statsd.histogram('flask_app.response_time', response_time,
-                    tags=[f'endpoint:{request.endpoint}', f'method:{request.method}', f'status:{response.status_code}'])
-    
-    statsd.increment('flask_app.responses.count',
-                    tags=[f'endpoint:{request.endpoint}', f'method:{request.method}', f'status:{response.status_code}'])
-    
+    request_finished(request.endpoint, request.method, request.path, response.status_code, request.start_time)
     return response
 
+# Batched ingestion into simple_metrics (see ingest.py); points are buffered
+# in memory and written by a background thread in multi-row inserts
+ingest_buffer = MetricIngestBuffer(db_pool)
+ingest_buffer.start()
+atexit.register(ingest_buffer.close)
+
+# Rollups for range queries, maintained incrementally in the background
+rollup_job = RollupJob(db_pool)
+rollup_job.start()
+
+points_received = request_metrics.counter('flask_app.ingest.points_received')
+ingest_rejected = request_metrics.counter('flask_app.ingest.rejected', ('reason',))
+
 # Simple API Endpoints
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -115,16 +145,12 @@ def health_check():
     
     # Simple database health check
     try:
-        conn = get_db_connection()
-        if conn:
+        with db_pool.connection() as conn:
             with conn.cursor() as cur:
                 cur.execute('SELECT 1')
-            conn.close()
-        else:
-            db_status = 'unhealthy'
     except Exception as e:
         db_status = f'unhealthy: {str(e)[:50]}'
-        logger.error(f"Database health check failed: {e}")
+        logger.error("Database health check failed: %s", e)
     
     overall_status = 'healthy' if db_status == 'healthy' else 'degraded'
     
@@ -160,7 +186,7 @@ def error_endpoint():
     
     statsd.increment('flask_app.simulated_errors.count', tags=[f'error_type:{error_type}'])
     
-    logger.error(f"Simulated {error_type} error")
+    logger.error("Simulated %s error", error_type)
     
     return jsonify({
         'error': f'Simulated {error_type} error',
@@ -170,26 +196,135 @@ def error_endpoint():
 
 @app.route('/api/load', methods=['GET'])
 def load_test():
-    """Generate some CPU load for testing"""
-    operations = int(request.args.get('operations', 1000))
-    
-    start_time = time.time()
+    """Generate a known CPU or memory load for testing
     
-    # Simulate CPU work
-    result = 0
-    for i in range(operations):
-        result += sum(range(100))
+    ?kernel= picks the load profile (python, numpy, memory, alloc; see
+    load_kernels.py) and ?workers= spreads it over that many processes.
+    """
+    try:
+        operations = int(request.args.get('operations', 1000))
+        kernel = request.args.get('kernel', 'python')
+        workers = int(request.args.get('workers', 1))
+        
+        # Runs in the process pool; this thread just waits for the result
+        load = run_load(kernel, operations, workers)
+    except ValueError as e:
+        logger.warning("Invalid load test request: %s", e)
+        return jsonify({'error': f'Invalid load test request: {e}'}), 400
     
-    duration = time.time() - start_time
-    statsd.histogram('flask_app.load_test.duration', duration, tags=[f'operations:{operations}'])
+    duration = load['duration']
+    statsd.histogram('flask_app.load_test.duration', duration,
+                     tags=[f'operations:{operations}', f'kernel:{kernel}', f'workers:{load["workers"]}'])
+    statsd.gauge('flask_app.load_test.throughput', load['throughput'],
+                 tags=[f'kernel:{kernel}', f'workers:{load["workers"]}'])
     
     return jsonify({
         'operations': operations,
+        'kernel': kernel,
+        'unit': load['unit'],
+        'workers': load['workers'],
         'duration': f'{duration:.3f}s',
-        'result': result,
+        'worker_durations': load['worker_durations'],
+        'throughput': round(load['throughput'], 2),
+        'result': load['result'],
         'timestamp': datetime.utcnow().isoformat()
     })
 
+@app.route('/api/metrics', methods=['POST'])
+def ingest_metrics():
+    """Ingest metric points into simple_metrics
+    
+    Accepts a JSON array of {"name", "value", "timestamp"} objects (timestamp
+    is optional: epoch seconds or ISO 8601), or the same objects as NDJSON
+    with Content-Type application/x-ndjson. Points are written asynchronously.
+    """
+    try:
+        rows = parse_points(request.get_data(as_text=True), request.content_type)
+    except (ValueError, OverflowError, OSError) as e:
+        ingest_rejected.increment('validation')
+        logger.warning("Invalid metrics payload: %s", e)
+        return jsonify({'error': f'Invalid metrics payload: {e}'}), 400
+    
+    if not ingest_buffer.add(rows):
+        # Backpressure: the writer is behind, so ask the client to retry
+        ingest_rejected.increment('buffer_full')
+        response = jsonify({'error': 'Ingest buffer full, retry later'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    
+    points_received.increment(value=len(rows))
+    return jsonify({'accepted': len(rows)}), 202
+
+# Range queries return at most this many buckets; ask for a larger step
+MAX_QUERY_BUCKETS = 10000
+
+@app.route('/api/metrics/query', methods=['GET'])
+def query_metrics():
+    """Aggregated buckets (avg/min/max/count) for one metric
+    
+    Query parameters: name (required), from and to (epoch seconds or
+    ISO 8601; default the last hour) and step in seconds (default 60).
+    """
+    try:
+        name = request.args.get('name')
+        if not name:
+            raise ValueError("name is required")
+        step = int(request.args.get('step', 60))
+        if step < 1:
+            raise ValueError("step must be a positive number of seconds")
+        now = time.time()
+        start = parse_timestamp(_query_time(request.args.get('from')), datetime.utcfromtimestamp(now - 3600))
+        end = parse_timestamp(_query_time(request.args.get('to')), datetime.utcfromtimestamp(now))
+        
+        # Align the range to whole buckets so rollup rows are never split
+        start_epoch = (int(start.replace(tzinfo=timezone.utc).timestamp()) // step) * step
+        end_epoch = -(-int(end.replace(tzinfo=timezone.utc).timestamp()) // step) * step
+        if end_epoch <= start_epoch:
+            raise ValueError("to must be after from")
+        if (end_epoch - start_epoch) // step > MAX_QUERY_BUCKETS:
+            raise ValueError(f"range covers more than {MAX_QUERY_BUCKETS} buckets; use a larger step")
+    except (ValueError, OverflowError, OSError) as e:
+        logger.warning("Invalid metrics query: %s", e)
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+    
+    try:
+        query_start = time.time()
+        with db_pool.connection() as conn:
+            source, buckets = query_series(
+                conn, name,
+                datetime.utcfromtimestamp(start_epoch), datetime.utcfromtimestamp(end_epoch), step
+            )
+        statsd.histogram('flask_app.metrics_query.duration', (time.time() - query_start) * 1000,
+                         tags=[f'source:{source}'])
+        
+        return jsonify({
+            'name': name,
+            'from': start_epoch,
+            'to': end_epoch,
+            'step': step,
+            'source': source,
+            'buckets': buckets
+        })
+    except Exception as e:
+        logger.error("Error querying metrics: %s", e)
+        return jsonify({'error': 'Failed to query metrics'}), 500
+
+def _query_time(value):
+    # Query strings are text; numeric values are epoch seconds
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+# System metrics are sampled on a background thread (see system_sampler.py),
+# which also sends them to Datadog; the endpoint only reads the latest sample
+SYSTEM_METRICS_MAX_WINDOW_SECONDS = 3600
+
+system_sampler = SystemSampler(tags=['container:flask-api'])
+system_sampler.start()
+
 @app.route('/api/system-metrics', methods=['GET'])
 def system_metrics():
     """Get system metrics from inside the container
@@ -198,45 +333,30 @@ def system_metrics():
     where the Datadog agent cannot directly access host-level container metrics
     due to the Linux VM layer. We use psutil to get metrics from within the 
     container and send them directly to Datadog as custom metrics.
+    
+    Pass ?window=N to add min/avg/max over the last N seconds of samples.
     """
     try:
-        # Get CPU usage
-        cpu_percent = psutil.cpu_percent(interval=1)
-        cpu_count = psutil.cpu_count()
-        
-        # Get memory usage
-        memory = psutil.virtual_memory()
-        
-        # Get disk usage
-        disk = psutil.disk_usage('/')
+        snapshot = system_sampler.latest()
+        if snapshot is None:
+            return jsonify({'error': 'System metrics not sampled yet'}), 503
         
-        # Send metrics to Datadog
-        statsd.gauge('flask_app.system.cpu_percent', cpu_percent, tags=['container:flask-api'])
-        statsd.gauge('flask_app.system.memory_percent', memory.percent, tags=['container:flask-api'])
+        metrics_data = dict(snapshot)
         
-        metrics_data = {
-            'cpu': {
-                'percent': cpu_percent,
-                'count': cpu_count
-            },
-            'memory': {
-                'percent': memory.percent,
-                'used_mb': round(memory.used / 1024 / 1024, 2),
-                'available_mb': round(memory.available / 1024 / 1024, 2),
-                'total_mb': round(memory.total / 1024 / 1024, 2)
-            },
-            'disk': {
-                'percent': disk.percent,
-                'used_gb': round(disk.used / 1024 / 1024 / 1024, 2),
-                'free_gb': round(disk.free / 1024 / 1024 / 1024, 2)
-            },
-            'timestamp': datetime.utcnow().isoformat()
-        }
+        window = request.args.get('window')
+        if window is not None:
+            seconds = int(window)
+            if not 1 <= seconds <= SYSTEM_METRICS_MAX_WINDOW_SECONDS:
+                raise ValueError(f"window must be between 1 and {SYSTEM_METRICS_MAX_WINDOW_SECONDS}")
+            metrics_data['window'] = system_sampler.window(seconds)
         
         return jsonify(metrics_data)
         
+    except ValueError as e:
+        logger.warning("Invalid system metrics request: %s", e)
+        return jsonify({'error': 'Invalid window'}), 400
     except Exception as e:
-        logger.error(f"Error getting system metrics: {e}")
+        logger.error("Error getting system metrics: %s", e)
         return jsonify({'error': 'Failed to get system metrics'}), 500
 
 # Error Handlers
@@ -0,0 +1,55 @@
+"""
+ASGI entry point for the sandbox API.
+
+Under the WSGI server every in-flight request holds a worker thread, so a
+burst of ``/api/slow`` calls (each sleeping 1-3s) can leave nothing free
+for ``/api/health``. Here ``/api/slow`` is a native async endpoint that
+awaits its delay on the event loop without holding a thread. Every other
+route is served by the unchanged Flask app, mounted through a WSGI adapter
+that runs it in a pool of ``WSGI_THREADS`` threads.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+The Docker image starts it this way when ``SERVER_MODE=asgi``.
+"""
+import asyncio
+import os
+import random
+from datetime import datetime
+
+from a2wsgi import WSGIMiddleware
+from datadog import statsd
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+from app import app as flask_app, request_finished, request_started
+
+# Threads running the Flask routes; the same budget as the WSGI server's
+# (see the Dockerfile)
+WSGI_THREADS = int(os.getenv('WSGI_THREADS', '10'))
+
+
+async def slow_endpoint(request):
+    """Simulate a slow endpoint for testing monitoring, without blocking a thread"""
+    start_time = request_started('slow_endpoint', request.method)
+
+    delay = random.uniform(1, 3)  # 1-3 second delay
+    await asyncio.sleep(delay)
+
+    statsd.histogram('flask_app.slow_endpoint.duration', delay)
+
+    response = JSONResponse({
+        'message': f'This endpoint took {delay:.2f} seconds',
+        'delay': delay,
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+    request_finished('slow_endpoint', request.method, request.url.path, response.status_code, start_time)
+    return response
+
+
+app = Starlette(routes=[
+    Route('/api/slow', slow_endpoint, methods=['GET']),
+    Mount('/', app=WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+])
@@ -0,0 +1,217 @@
+"""
+Thread-safe psycopg2 connection pool.
+
+Opening a connection costs a TCP handshake, authentication and a backend
+fork on the Postgres side, which dwarfs a ``SELECT 1``. ``ConnectionPool``
+keeps between ``min_size`` and ``max_size`` connections open:
+
+- ``connection()`` checks one out for the duration of a ``with`` block,
+  waiting up to ``checkout_timeout`` seconds when all of them are in use
+- a connection that has been idle longer than ``validate_after`` seconds is
+  pinged before it is handed out; broken ones are replaced transparently
+- a maintenance thread closes connections idle for more than
+  ``idle_timeout`` seconds (down to ``min_size``), reopens the minimum after
+  the database comes back, and reports pool gauges to statsd
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from datadog import statsd
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_IDLE_TIMEOUT_SECONDS = float(os.getenv('DB_POOL_IDLE_TIMEOUT_SECONDS', '300'))
+DB_POOL_CHECKOUT_TIMEOUT_SECONDS = float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT_SECONDS', '5'))
+DB_POOL_VALIDATE_AFTER_SECONDS = float(os.getenv('DB_POOL_VALIDATE_AFTER_SECONDS', '30'))
+MAINTENANCE_INTERVAL_SECONDS = 10.0
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the checkout timeout."""
+
+
+class ConnectionPool:
+    """Bounded pool of psycopg2 connections."""
+
+    def __init__(self, dsn, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+                 idle_timeout=DB_POOL_IDLE_TIMEOUT_SECONDS, checkout_timeout=DB_POOL_CHECKOUT_TIMEOUT_SECONDS,
+                 validate_after=DB_POOL_VALIDATE_AFTER_SECONDS, metric_prefix='db_pool', **connect_kwargs):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.validate_after = validate_after
+        self.metric_prefix = metric_prefix
+        self.connect_kwargs = connect_kwargs
+
+        # (connection, returned_at); checkouts take the most recently used
+        # connection so the oldest ones age out under light load
+        self._idle = deque()
+        self._size = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='db-pool-maintenance', daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        return psycopg2.connect(self.dsn, **self.connect_kwargs)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; it is rolled back and returned on exit."""
+        conn = self._checkout()
+        try:
+            yield conn
+        except Exception:
+            self._release(conn, rollback=True)
+            raise
+        else:
+            self._release(conn, rollback=False)
+
+    def _checkout(self):
+        deadline = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Reserve the slot, then connect outside the lock
+                    self._size += 1
+                    conn = None
+                    break
+                if deadline is None:
+                    deadline = time.monotonic() + self.checkout_timeout
+                    wait_start = time.monotonic()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    statsd.increment(f'{self.metric_prefix}.timeouts')
+                    raise PoolTimeout(f"No database connection available after {self.checkout_timeout}s")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        if deadline is not None:
+            # Only checkouts that found the pool saturated report a wait
+            statsd.histogram(f'{self.metric_prefix}.wait_time', (time.monotonic() - wait_start) * 1000)
+
+        if conn is not None:
+            if self._is_usable(conn, returned_at):
+                return conn
+            self._close(conn)
+            # The slot is still ours; replace the broken connection
+        try:
+            return self._connect()
+        except Exception:
+            self._discard_slot()
+            raise
+
+    def _is_usable(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.validate_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning("Discarding broken pooled connection: %s", e)
+            return False
+
+    def _release(self, conn, rollback):
+        if not conn.closed:
+            try:
+                if rollback or conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                self._close(conn)
+        if conn.closed:
+            self._discard_slot()
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _run(self):
+        while True:
+            self._maintain()
+            self.report()
+            if self._stop.wait(MAINTENANCE_INTERVAL_SECONDS):
+                return
+
+    def _maintain(self):
+        expired = []
+        now = time.monotonic()
+        with self._cond:
+            # Oldest idle connections are at the left
+            while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+                expired.append(self._idle.popleft()[0])
+                self._size -= 1
+            missing = self.min_size - self._size
+            self._size += max(missing, 0)
+        for conn in expired:
+            self._close(conn)
+
+        for _ in range(missing):
+            try:
+                conn = self._connect()
+            except Exception as e:
+                logger.error("Could not open pooled database connection: %s", e)
+                self._discard_slot()
+                continue
+            self._release(conn, rollback=False)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'waiting': self._waiting,
+                'max_size': self.max_size,
+            }
+
+    def report(self):
+        """Send pool gauges to statsd."""
+        stats = self.stats()
+        for name in ('size', 'idle', 'in_use', 'waiting'):
+            statsd.gauge(f'{self.metric_prefix}.{name}', stats[name])
+        statsd.gauge(f'{self.metric_prefix}.utilization', stats['in_use'] / stats['max_size'])
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._cond:
+            idle, self._idle = self._idle, deque()
+            self._size -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
@@ -0,0 +1,174 @@
+"""
+Buffered ingestion of metric points into ``simple_metrics``.
+
+``POST /api/metrics`` parses and validates points, then hands them to
+``MetricIngestBuffer`` and returns. A writer thread drains the buffer into
+Postgres with multi-row ``execute_values`` inserts, flushing as soon as
+``batch_size`` points are waiting or every ``flush_interval`` seconds. The
+buffer is bounded: once ``max_points`` are waiting, ``add()`` refuses new
+points and the endpoint answers 503 with ``Retry-After`` so clients back off
+instead of growing the process without limit.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+from datadog import statsd
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+INGEST_BUFFER_SIZE = int(os.getenv('INGEST_BUFFER_SIZE', '200000'))
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '5000'))
+INGEST_FLUSH_INTERVAL_SECONDS = float(os.getenv('INGEST_FLUSH_INTERVAL_SECONDS', '1'))
+MAX_POINTS_PER_REQUEST = 50000
+MAX_METRIC_NAME_LENGTH = 100
+RETRY_BACKOFF_SECONDS = 1.0
+
+
+def parse_points(body, content_type):
+    """
+    Parse a JSON array (or ``{"points": [...]}``) or NDJSON body into
+    ``(name, value, timestamp)`` rows. Raises ValueError on bad input.
+    """
+    if content_type and content_type.startswith('application/x-ndjson'):
+        raw_points = [json.loads(line) for line in body.splitlines() if line.strip()]
+    else:
+        raw_points = json.loads(body)
+        if isinstance(raw_points, dict):
+            raw_points = raw_points.get('points')
+    if not isinstance(raw_points, list):
+        raise ValueError("Expected a JSON array of points")
+    if len(raw_points) > MAX_POINTS_PER_REQUEST:
+        raise ValueError(f"At most {MAX_POINTS_PER_REQUEST} points per request")
+
+    now = datetime.utcnow()
+    rows = []
+    for point in raw_points:
+        if not isinstance(point, dict):
+            raise ValueError("Each point must be an object")
+        name = point.get('name')
+        value = point.get('value')
+        if not isinstance(name, str) or not 0 < len(name) <= MAX_METRIC_NAME_LENGTH:
+            raise ValueError(f"name must be a string of 1-{MAX_METRIC_NAME_LENGTH} characters")
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"value for {name} must be a finite number")
+        rows.append((name, float(value), parse_timestamp(point.get('timestamp'), now)))
+    return rows
+
+
+def parse_timestamp(timestamp, default):
+    """Parse epoch seconds or ISO 8601 into a naive UTC datetime, like CURRENT_TIMESTAMP."""
+    if timestamp is None:
+        return default
+    try:
+        if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+            return datetime.utcfromtimestamp(timestamp)
+        if isinstance(timestamp, str):
+            parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+            if parsed.tzinfo is not None:
+                parsed = datetime.utcfromtimestamp(parsed.timestamp())
+            return parsed
+    except (OverflowError, OSError) as e:
+        # Out-of-range epochs (e.g. 1e20, inf) or offsets past year 1/9999
+        raise ValueError(f"timestamp out of range: {timestamp!r}") from e
+    raise ValueError("timestamp must be epoch seconds or an ISO 8601 string")
+
+
+class MetricIngestBuffer:
+    """Bounded in-memory buffer of points, written to Postgres in batches."""
+
+    def __init__(self, db_pool, max_points=INGEST_BUFFER_SIZE, batch_size=INGEST_BATCH_SIZE,
+                 flush_interval=INGEST_FLUSH_INTERVAL_SECONDS, metric_prefix='flask_app.ingest'):
+        self.db_pool = db_pool
+        self.max_points = max_points
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metric_prefix = metric_prefix
+        self._rows = []
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='metric-ingest-writer', daemon=True)
+        self._thread.start()
+
+    def add(self, rows):
+        """Queue rows for writing; returns False if the buffer is full."""
+        with self._cond:
+            if len(self._rows) + len(rows) > self.max_points:
+                return False
+            self._rows.extend(rows)
+            if len(self._rows) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                if len(self._rows) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+            if not self.flush() and not self._stop.is_set():
+                # Leave the database alone for a moment after a failure
+                self._stop.wait(RETRY_BACKOFF_SECONDS)
+
+    def flush(self):
+        """Write everything buffered so far; returns False if a write failed."""
+        with self._cond:
+            rows, self._rows = self._rows, []
+        statsd.gauge(f'{self.metric_prefix}.buffered', len(rows))
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            if not self._write(batch):
+                self._requeue(rows[start:])
+                return False
+        return True
+
+    def _write(self, batch):
+        start_time = time.time()
+        try:
+            with self.db_pool.connection() as conn:
+                with conn.cursor() as cur:
+                    execute_values(
+                        cur,
+                        "INSERT INTO simple_metrics (metric_name, metric_value, timestamp) VALUES %s",
+                        batch,
+                        page_size=len(batch)
+                    )
+                conn.commit()
+        except Exception as e:
+            logger.error("Failed to write %s metric points: %s", len(batch), e)
+            statsd.increment(f'{self.metric_prefix}.write_errors')
+            return False
+        statsd.histogram(f'{self.metric_prefix}.batch_size', len(batch))
+        statsd.histogram(f'{self.metric_prefix}.flush_latency', (time.time() - start_time) * 1000)
+        statsd.increment(f'{self.metric_prefix}.points_written', len(batch))
+        return True
+
+    def _requeue(self, rows):
+        # Failed rows go back in front of anything that arrived meanwhile;
+        # whatever no longer fits in the buffer is dropped
+        with self._cond:
+            room = max(self.max_points - len(self._rows), 0)
+            kept = rows[:room]
+            self._rows = kept + self._rows
+        dropped = len(rows) - len(kept)
+        if dropped:
+            logger.error("Dropped %s metric points after a failed write", dropped)
+            statsd.increment(f'{self.metric_prefix}.dropped', dropped)
+
+    def close(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
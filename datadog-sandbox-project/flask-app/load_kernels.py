@@ -0,0 +1,130 @@
+"""
+Load generation kernels for /api/load.
+
+Each kernel produces a known resource profile so Datadog dashboards can be
+calibrated against it:
+
+- ``python``: interpreter-bound CPU (the original ``sum(range(100))`` loop);
+  one operation sums 100 integers
+- ``numpy``: the same arithmetic vectorized with NumPy, when it is installed
+- ``memory``: memory bandwidth; one operation copies 1 MiB between buffers
+- ``alloc``: allocator and GC churn; one operation allocates 1000 small
+  objects
+
+``run_load()`` splits the operations over a process pool, so the work runs
+on up to ``workers`` cores and never holds the Flask process's GIL.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+LOAD_MAX_WORKERS = int(os.getenv('LOAD_MAX_WORKERS', str(os.cpu_count() or 1)))
+NUMPY_CHUNK_OPERATIONS = 100000
+MEMORY_BUFFER_MB = 64
+MIB = 1024 * 1024
+
+
+def python_kernel(operations):
+    result = 0
+    for i in range(operations):
+        result += sum(range(100))
+    return result
+
+
+def numpy_kernel(operations):
+    row = np.arange(100, dtype=np.int64)
+    result = 0
+    for start in range(0, operations, NUMPY_CHUNK_OPERATIONS):
+        chunk = min(NUMPY_CHUNK_OPERATIONS, operations - start)
+        result += int(np.broadcast_to(row, (chunk, 100)).sum())
+    return result
+
+
+def memory_kernel(operations):
+    size = min(MEMORY_BUFFER_MB, max(operations, 1)) * MIB
+    src = bytearray(os.urandom(MIB)) * (size // MIB)
+    dst = bytearray(size)
+    src_view, dst_view = memoryview(src), memoryview(dst)
+    offset = 0
+    for _ in range(operations):
+        dst_view[offset:offset + MIB] = src_view[offset:offset + MIB]
+        offset = (offset + MIB) % size
+    return operations
+
+
+def alloc_kernel(operations):
+    allocated = 0
+    for _ in range(operations):
+        objects = [{'id': i, 'tags': [i, i + 1]} for i in range(1000)]
+        allocated += len(objects)
+    return allocated
+
+
+KERNELS = {
+    'python': (python_kernel, 'sum of 100 ints'),
+    'memory': (memory_kernel, 'MiB copied'),
+    'alloc': (alloc_kernel, '1000 objects'),
+}
+if np is not None:
+    KERNELS['numpy'] = (numpy_kernel, 'sum of 100 ints')
+
+
+def _run_share(kernel_name, operations):
+    start = time.perf_counter()
+    result = KERNELS[kernel_name][0](operations)
+    return result, time.perf_counter() - start
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    # Forked rather than spawned: a spawned worker re-imports the main module,
+    # which under ``python app.py`` re-runs the app's startup (database pool,
+    # background threads, log listener) in every worker. Forked workers only
+    # run the kernels above, which take none of the locks those threads hold.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=LOAD_MAX_WORKERS,
+                                        mp_context=multiprocessing.get_context('fork'))
+        return _pool
+
+
+def run_load(kernel_name, operations, workers=1):
+    """
+    Run ``operations`` units of ``kernel_name`` split over ``workers``
+    processes and return the combined result and timings.
+    """
+    if kernel_name not in KERNELS:
+        raise ValueError(f"kernel must be one of: {', '.join(sorted(KERNELS))}")
+    if operations < 1:
+        raise ValueError("operations must be positive")
+    if not 1 <= workers <= LOAD_MAX_WORKERS:
+        raise ValueError(f"workers must be between 1 and {LOAD_MAX_WORKERS}")
+
+    shares = [operations // workers + (1 if i < operations % workers else 0) for i in range(workers)]
+    pool = _get_pool()
+    start = time.perf_counter()
+    futures = [pool.submit(_run_share, kernel_name, share) for share in shares if share]
+    outcomes = [future.result() for future in futures]
+    duration = time.perf_counter() - start
+
+    return {
+        'kernel': kernel_name,
+        'unit': KERNELS[kernel_name][1],
+        'operations': operations,
+        'workers': len(futures),
+        'result': sum(result for result, _ in outcomes),
+        'duration': duration,
+        'worker_durations': [round(share_duration, 4) for _, share_duration in outcomes],
+        'throughput': operations / duration if duration > 0 else 0.0,
+    }
@@ -0,0 +1,173 @@
+"""
+Downsampled reads of ``simple_metrics``.
+
+Scanning raw points for a months-long dashboard range gets slower as the
+table grows, so ``RollupJob`` maintains two pre-aggregated tables, one row
+per metric and minute (``simple_metrics_1m``) or hour (``simple_metrics_1h``)
+holding count/sum/min/max. It runs every ``ROLLUP_INTERVAL_SECONDS`` and
+only folds in rows whose id is past a watermark, merging them into existing
+buckets, so late points are still counted.
+
+``query_series()`` answers a range query from the coarsest table whose
+resolution divides the requested step.
+
+Rows are rolled up one run after their id is first seen, which gives
+ingest transactions that were still in flight time to commit. Rollups
+therefore lag raw data by up to two intervals.
+"""
+import logging
+import os
+import threading
+import time
+
+from datadog import statsd
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_INTERVAL_SECONDS = float(os.getenv('ROLLUP_INTERVAL_SECONDS', '30'))
+
+# (table, resolution in seconds, date_trunc unit), coarsest first
+ROLLUPS = (
+    ('simple_metrics_1h', 3600, 'hour'),
+    ('simple_metrics_1m', 60, 'minute'),
+)
+
+SCHEMA = [
+    "CREATE INDEX IF NOT EXISTS simple_metrics_name_timestamp_idx ON simple_metrics (metric_name, timestamp)",
+    *(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            metric_name VARCHAR(100) NOT NULL,
+            bucket TIMESTAMP NOT NULL,
+            count BIGINT NOT NULL,
+            sum DOUBLE PRECISION NOT NULL,
+            min DOUBLE PRECISION NOT NULL,
+            max DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (metric_name, bucket)
+        )
+    """ for table, _, _ in ROLLUPS),
+    """
+        CREATE TABLE IF NOT EXISTS simple_metrics_rollup_state (
+            id INTEGER PRIMARY KEY,
+            last_id BIGINT NOT NULL
+        )
+    """,
+    "INSERT INTO simple_metrics_rollup_state (id, last_id) VALUES (1, 0) ON CONFLICT (id) DO NOTHING",
+]
+
+
+class RollupJob:
+    """Background job that folds new raw points into the rollup tables."""
+
+    def __init__(self, db_pool, interval=ROLLUP_INTERVAL_SECONDS, metric_prefix='flask_app.rollup'):
+        self.db_pool = db_pool
+        self.interval = interval
+        self.metric_prefix = metric_prefix
+        # Highest id seen on the previous run; this run rolls up to it
+        self._seen_max_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='metric-rollup', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("Metric rollup failed: %s", e)
+                statsd.increment(f'{self.metric_prefix}.errors')
+
+    def run_once(self):
+        """Roll up rows up to the max id seen last time; returns rows folded in."""
+        start_time = time.time()
+        with self.db_pool.connection() as conn:
+            with conn.cursor() as cur:
+                # The row lock serializes concurrent jobs (e.g. the debug
+                # reloader's two processes) so no row is counted twice
+                cur.execute("SELECT last_id FROM simple_metrics_rollup_state WHERE id = 1 FOR UPDATE")
+                last_id = cur.fetchone()['last_id']
+                cur.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM simple_metrics")
+                max_id = cur.fetchone()['max_id']
+
+                upper_id = self._seen_max_id if self._seen_max_id is not None else last_id
+                self._seen_max_id = max_id
+                if upper_id <= last_id:
+                    conn.commit()
+                    return 0
+
+                for table, _, unit in ROLLUPS:
+                    cur.execute(f"""
+                        INSERT INTO {table} (metric_name, bucket, count, sum, min, max)
+                        SELECT metric_name, date_trunc('{unit}', timestamp),
+                               COUNT(*), SUM(metric_value), MIN(metric_value), MAX(metric_value)
+                        FROM simple_metrics
+                        WHERE id > %s AND id <= %s
+                        GROUP BY 1, 2
+                        ON CONFLICT (metric_name, bucket) DO UPDATE SET
+                            count = {table}.count + EXCLUDED.count,
+                            sum = {table}.sum + EXCLUDED.sum,
+                            min = LEAST({table}.min, EXCLUDED.min),
+                            max = GREATEST({table}.max, EXCLUDED.max)
+                    """, (last_id, upper_id))
+                cur.execute("UPDATE simple_metrics_rollup_state SET last_id = %s WHERE id = 1", (upper_id,))
+            conn.commit()
+
+        statsd.histogram(f'{self.metric_prefix}.duration', (time.time() - start_time) * 1000)
+        statsd.increment(f'{self.metric_prefix}.ids_processed', upper_id - last_id)
+        return upper_id - last_id
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def choose_source(step):
+    """Pick the coarsest table that can serve buckets of ``step`` seconds."""
+    for table, resolution, _ in ROLLUPS:
+        if step >= resolution and step % resolution == 0:
+            return table
+    return 'simple_metrics'
+
+
+def query_series(conn, name, start, end, step):
+    """
+    Aggregate ``name`` over [start, end) into ``step``-second buckets.
+
+    Returns the table that was read and a list of bucket dicts.
+    """
+    source = choose_source(step)
+    if source == 'simple_metrics':
+        sql = """
+            SELECT FLOOR(EXTRACT(EPOCH FROM timestamp) / %(step)s) * %(step)s AS bucket,
+                   COUNT(*) AS count, AVG(metric_value) AS avg,
+                   MIN(metric_value) AS min, MAX(metric_value) AS max
+            FROM simple_metrics
+            WHERE metric_name = %(name)s AND timestamp >= %(start)s AND timestamp < %(end)s
+            GROUP BY 1 ORDER BY 1
+        """
+    else:
+        sql = f"""
+            SELECT FLOOR(EXTRACT(EPOCH FROM bucket) / %(step)s) * %(step)s AS bucket,
+                   SUM(count) AS count, SUM(sum) / SUM(count) AS avg,
+                   MIN(min) AS min, MAX(max) AS max
+            FROM {source}
+            WHERE metric_name = %(name)s AND bucket >= %(start)s AND bucket < %(end)s
+            GROUP BY 1 ORDER BY 1
+        """
+    with conn.cursor() as cur:
+        cur.execute(sql, {'name': name, 'start': start, 'end': end, 'step': step})
+        rows = cur.fetchall()
+    buckets = [
+        {
+            'timestamp': int(row['bucket']),
+            'count': int(row['count']),
+            'avg': float(row['avg']),
+            'min': float(row['min']),
+            'max': float(row['max']),
+        }
+        for row in rows
+    ]
+    return source, buckets
@@ -0,0 +1,140 @@
+"""
+Background system metrics sampler.
+
+``psutil.cpu_percent(interval=1)`` sleeps for a second to measure CPU, so
+calling it from a request handler ties up a worker thread. ``SystemSampler``
+measures on its own thread instead: every ``interval`` seconds it records
+CPU, memory, disk and per-process stats into a small ring buffer and pushes
+them to statsd as gauges. ``/api/system-metrics`` only reads the buffer.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import psutil
+from datadog import statsd
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_SAMPLE_INTERVAL_SECONDS = float(os.getenv('SYSTEM_SAMPLE_INTERVAL_SECONDS', '5'))
+# Ten minutes of history at the default interval
+SYSTEM_SAMPLE_HISTORY = int(os.getenv('SYSTEM_SAMPLE_HISTORY', '120'))
+# cpu_percent() with no interval measures since the previous call, so the
+# first sample waits this long after the counters are primed
+WARMUP_SECONDS = 0.5
+
+# Snapshot fields that windowed aggregates are computed for
+AGGREGATED_FIELDS = (
+    ('cpu', 'percent'),
+    ('memory', 'percent'),
+    ('disk', 'percent'),
+    ('process', 'cpu_percent'),
+    ('process', 'rss_mb'),
+)
+
+
+class SystemSampler:
+    """Samples system stats on a fixed cadence into a ring buffer."""
+
+    def __init__(self, interval=SYSTEM_SAMPLE_INTERVAL_SECONDS, history=SYSTEM_SAMPLE_HISTORY,
+                 metric_prefix='flask_app', tags=None):
+        self.interval = interval
+        self.metric_prefix = metric_prefix
+        self.tags = tags or []
+        self._samples = deque(maxlen=history)
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='system-sampler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        psutil.cpu_percent(interval=None)
+        self._process.cpu_percent(interval=None)
+        if self._stop.wait(WARMUP_SECONDS):
+            return
+        while True:
+            try:
+                snapshot = self.sample()
+                self._samples.append(snapshot)
+                self.report(snapshot)
+            except Exception as e:
+                logger.error("System metrics sampling failed: %s", e)
+            if self._stop.wait(self.interval):
+                return
+
+    def sample(self):
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        process = self._process
+        with process.oneshot():
+            process_memory = process.memory_info()
+            process_stats = {
+                'cpu_percent': process.cpu_percent(interval=None),
+                'rss_mb': round(process_memory.rss / 1024 / 1024, 2),
+                'threads': process.num_threads(),
+                'open_fds': process.num_fds() if hasattr(process, 'num_fds') else None,
+            }
+        return {
+            'cpu': {
+                'percent': psutil.cpu_percent(interval=None),
+                'count': psutil.cpu_count()
+            },
+            'memory': {
+                'percent': memory.percent,
+                'used_mb': round(memory.used / 1024 / 1024, 2),
+                'available_mb': round(memory.available / 1024 / 1024, 2),
+                'total_mb': round(memory.total / 1024 / 1024, 2)
+            },
+            'disk': {
+                'percent': disk.percent,
+                'used_gb': round(disk.used / 1024 / 1024 / 1024, 2),
+                'free_gb': round(disk.free / 1024 / 1024 / 1024, 2)
+            },
+            'process': process_stats,
+            'timestamp': datetime.utcnow().isoformat(),
+            'sampled_at': time.time(),
+        }
+
+    def report(self, snapshot):
+        """Push one snapshot to statsd as gauges."""
+        prefix = self.metric_prefix
+        statsd.gauge(f'{prefix}.system.cpu_percent', snapshot['cpu']['percent'], tags=self.tags)
+        statsd.gauge(f'{prefix}.system.memory_percent', snapshot['memory']['percent'], tags=self.tags)
+        statsd.gauge(f'{prefix}.system.disk_percent', snapshot['disk']['percent'], tags=self.tags)
+        process = snapshot['process']
+        statsd.gauge(f'{prefix}.process.cpu_percent', process['cpu_percent'], tags=self.tags)
+        statsd.gauge(f'{prefix}.process.rss_mb', process['rss_mb'], tags=self.tags)
+        statsd.gauge(f'{prefix}.process.threads', process['threads'], tags=self.tags)
+        if process['open_fds'] is not None:
+            statsd.gauge(f'{prefix}.process.open_fds', process['open_fds'], tags=self.tags)
+
+    def latest(self):
+        """Most recent snapshot, or None before the first sample."""
+        samples = self._samples
+        return samples[-1] if samples else None
+
+    def window(self, seconds):
+        """min/avg/max of the numeric stats sampled in the last ``seconds``."""
+        cutoff = time.time() - seconds
+        samples = [s for s in list(self._samples) if s['sampled_at'] >= cutoff]
+        aggregates = {'seconds': seconds, 'samples': len(samples)}
+        for group, field in AGGREGATED_FIELDS:
+            values = [s[group][field] for s in samples]
+            if values:
+                aggregates[f'{group}_{field}'] = {
+                    'min': min(values),
+                    'avg': round(sum(values) / len(values), 2),
+                    'max': max(values),
+                }
+        return aggregates
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,104 @@
+"""
+Health-check latency while /api/slow is flooded.
+
+Fires --concurrency simultaneous /api/slow calls at a running app and, while
+they are in flight, probes /api/health every --probe-interval seconds. If
+slow requests tie up the server's threads (the default WSGI mode runs 1
+gunicorn worker of 10 threads), the probes queue behind them until the slow
+calls drain or the probes time out; with the async endpoint
+(SERVER_MODE=asgi) it should stay flat.
+
+    pip install httpx
+    python scripts/slow_concurrency_benchmark.py --url http://localhost:5001 --concurrency 200
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+import httpx
+
+CLIENT_POOL_SIZE = 25
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+async def call_slow(client, url, results):
+    start = time.perf_counter()
+    try:
+        response = await client.get(f'{url}/api/slow')
+        results['ok' if response.status_code == 200 else 'failed'] += 1
+    except httpx.HTTPError:
+        results['failed'] += 1
+    results['durations'].append(time.perf_counter() - start)
+
+
+async def slow_group(url, count, timeout, results):
+    # httpx scans its pool per request, so hundreds of connections on one
+    # client cost more client CPU than the server spends; keep pools small
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=count), timeout=timeout) as client:
+        await asyncio.gather(*(call_slow(client, url, results) for _ in range(count)))
+
+
+def probe_health(url, interval, timeout, done, latencies, failures):
+    # Runs on its own thread with a blocking client so the probes are not
+    # delayed by this script's event loop juggling hundreds of connections
+    with httpx.Client(timeout=timeout) as client:
+        while not done.is_set():
+            start = time.perf_counter()
+            try:
+                response = client.get(f'{url}/api/health')
+                if response.status_code != 200:
+                    failures.append(response.status_code)
+            except httpx.HTTPError as e:
+                failures.append(type(e).__name__)
+            latencies.append((time.perf_counter() - start) * 1000)
+            done.wait(interval)
+
+
+async def run(args):
+    # Baseline health latency with nothing else in flight
+    baseline = []
+    with httpx.Client(timeout=args.timeout) as client:
+        for _ in range(10):
+            start = time.perf_counter()
+            client.get(f'{args.url}/api/health')
+            baseline.append((time.perf_counter() - start) * 1000)
+
+    results = {'ok': 0, 'failed': 0, 'durations': []}
+    latencies, failures = [], []
+    done = threading.Event()
+    prober = threading.Thread(target=probe_health, args=(args.url, args.probe_interval, args.timeout, done,
+                                                         latencies, failures))
+    prober.start()
+    start = time.perf_counter()
+    groups = [min(CLIENT_POOL_SIZE, args.concurrency - i) for i in range(0, args.concurrency, CLIENT_POOL_SIZE)]
+    await asyncio.gather(*(slow_group(args.url, count, args.timeout, results) for count in groups))
+    elapsed = time.perf_counter() - start
+    done.set()
+    prober.join()
+
+    baseline.sort()
+    latencies.sort()
+    durations = sorted(results['durations'])
+    print(f"/api/slow:   {results['ok']} ok, {results['failed']} failed, all done in {elapsed:.1f}s"
+          f" (p50 {percentile(durations, 50):.2f}s, max {durations[-1]:.2f}s)")
+    print(f"/api/health idle:        p50 {percentile(baseline, 50):.1f}ms  max {baseline[-1]:.1f}ms")
+    if latencies:
+        print(f"/api/health under load:  p50 {percentile(latencies, 50):.1f}ms  p99 {percentile(latencies, 99):.1f}ms"
+              f"  max {latencies[-1]:.1f}ms  ({len(latencies)} probes, {len(failures)} failed)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5001')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--probe-interval', type=float, default=0.1)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,13 +3,14 @@ FastAPI application for Image Thumbnail Generator API service.
 """
 from datetime import datetime
 from fastapi import FastAPI
+from sqlalchemy import func
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from api.routes import images
 from api.models.schemas import HealthResponse
-from shared.database import init_db
-from shared.pubsub_client import get_pubsub_client
+from shared.config import Config
+from shared.database import init_db, OutboxMessage
 
 
 @asynccontextmanager
@@ -20,12 +21,11 @@ async def lifespan(app: FastAPI):
     """
     print("🚀 Starting Image Thumbnail Generator API...")
     
+    # Uploads only write to the database; the outbox relay publishes them,
+    # so the API starts and accepts uploads while Pub/Sub is unavailable
     init_db()
     print("✅ Database initialized")
     
-    pubsub_client = get_pubsub_client()
-    print("✅ Pub/Sub client initialized")
-    
     yield
     
     print("👋 Shutting down API service...")
@@ -53,32 +53,39 @@ def health_check():
     """
     Health check endpoint.
     
-    Verifies that the API service is running and can connect to dependencies.
+    Verifies that the API service is running and can reach the database.
+    Pub/Sub is not checked: uploads only write to the outbox, so the outbox
+    backlog is reported instead. A lagging outbox means the relay is behind,
+    not that the API is unhealthy.
     """
     db_status = "unknown"
+    outbox_status = "unknown"
+    outbox_pending = None
+    outbox_oldest_age = None
     try:
-        from shared.database import engine
-        if engine:
-            connection = engine.connect()
-            connection.close()
+        from shared.database import SessionLocal
+        if SessionLocal:
+            with SessionLocal() as db:
+                outbox_pending, oldest = db.query(
+                    func.count(OutboxMessage.id), func.min(OutboxMessage.created_at)
+                ).one()
             db_status = "healthy"
+            outbox_oldest_age = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+            if outbox_oldest_age > Config.OUTBOX_MAX_AGE_SECONDS:
+                outbox_status = f"lagging: oldest message is {outbox_oldest_age:.0f}s old"
+            else:
+                outbox_status = "healthy"
     except Exception as e:
         db_status = f"unhealthy: {str(e)}"
     
-    pubsub_status = "unknown"
-    try:
-        pubsub_client = get_pubsub_client()
-        if pubsub_client:
-            pubsub_status = "healthy"
-    except Exception as e:
-        pubsub_status = f"unhealthy: {str(e)}"
-    
     return HealthResponse(
-        status="healthy" if db_status == "healthy" and pubsub_status == "healthy" else "degraded",
+        status="healthy" if db_status == "healthy" else "degraded",
         service="image-api",
         timestamp=datetime.utcnow(),
         database=db_status,
-        pubsub=pubsub_status
+        outbox=outbox_status,
+        outbox_pending=outbox_pending,
+        outbox_oldest_age_seconds=outbox_oldest_age
     )
 
 
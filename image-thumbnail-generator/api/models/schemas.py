@@ -2,6 +2,7 @@
 Pydantic schemas for API request/response models.
 """
 from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel
 
 
@@ -21,5 +22,7 @@ class HealthResponse(BaseModel):
     service: str
     timestamp: datetime
     database: str
-    pubsub: str
+    outbox: str
+    outbox_pending: Optional[int] = None
+    outbox_oldest_age_seconds: Optional[float] = None
 
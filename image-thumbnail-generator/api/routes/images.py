@@ -1,21 +1,46 @@
 """
 Image API routes for upload and download.
 """
+import json
+import os
 from datetime import datetime
+from typing import Optional
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 
 from api.models.schemas import ImageUploadResponse
 from api.storage.file_handler import save_uploaded_file, file_exists
-from shared.database import get_db, Image, Thumbnail, ImageStatus
-from shared.pubsub_client import get_pubsub_client
+from shared.config import Config, THUMBNAIL_SIZES
+from shared.database import get_db, Image, Thumbnail, ImageStatus, OutboxMessage
 from shared.metrics import init_metrics, increment_counter, record_histogram
 
 init_metrics()
 
 router = APIRouter(prefix="/api/images", tags=["images"])
 
+CONTENT_HASH_ALGORITHM = "sha256"
+
+
+def find_processed_original(db: Session, content_hash: str) -> Optional[Image]:
+    """
+    Find a completed image with the same content whose original and
+    thumbnails are all still on disk, or None.
+    """
+    candidates = db.query(Image).filter(
+        Image.content_hash == content_hash,
+        Image.status == ImageStatus.COMPLETED
+    ).order_by(Image.processed_at).limit(5)
+    
+    for candidate in candidates:
+        thumbnails = {thumbnail.size_name: thumbnail for thumbnail in candidate.thumbnails}
+        if (set(thumbnails) >= set(THUMBNAIL_SIZES)
+                and file_exists(candidate.original_path)
+                and all(file_exists(thumbnail.file_path) for thumbnail in thumbnails.values())):
+            return candidate
+    return None
+
 
 @router.post("", response_model=ImageUploadResponse, status_code=201)
 async def upload_image(
@@ -26,43 +51,55 @@ async def upload_image(
     Upload an image for processing.
     
     - Validates the image file
-    - Saves to storage
-    - Creates database record
-    - Publishes message to Pub/Sub for processing
+    - Saves to storage, hashing the content
+    - Creates database record and, unless the same content was processed
+      before and its thumbnails can be reused, an outbox message that the
+      relay publishes to Pub/Sub for processing
     """
     try:
-        file_id, file_path, file_size = await save_uploaded_file(file)
+        file_id, file_path, file_size, content_hash = await save_uploaded_file(
+            file,
+            hash_algorithm=CONTENT_HASH_ALGORITHM if Config.DEDUP_UPLOADS else None
+        )
         
         increment_counter("image.upload.count", tags=["status:success"])
         record_histogram("image.upload.size_bytes", file_size)
         
+        # Database calls block, so they run on the threadpool rather than
+        # stalling every other request on the event loop
+        original = await run_in_threadpool(find_processed_original, db, content_hash) if content_hash else None
+        if original:
+            return await run_in_threadpool(create_duplicate, db, original, file_id, file_path,
+                                           file.filename or "unknown")
+        
+        uploaded_at = datetime.utcnow()
         image = Image(
             id=file_id,
             original_filename=file.filename or "unknown",
             original_path=file_path,
             original_size_bytes=file_size,
+            content_hash=content_hash,
             status=ImageStatus.UPLOADED,
-            uploaded_at=datetime.utcnow()
+            uploaded_at=uploaded_at
         )
+        # The task is written in the same transaction as the image and
+        # published by the outbox relay, so neither exists without the other
         db.add(image)
-        db.commit()
-        
-        pubsub_client = get_pubsub_client()
-        message = {
+        db.add(OutboxMessage(payload=json.dumps({
             "image_id": file_id,
             "file_path": file_path,
             "original_filename": file.filename,
-        }
-        message_id = pubsub_client.publish_message(message)
+        })))
+        await run_in_threadpool(db.commit)
         
-        print(f"📤 Published processing task for image {file_id} (message: {message_id})")
+        print(f"📤 Queued processing task for image {file_id}")
         
         return ImageUploadResponse(
             id=file_id,
             filename=file.filename or "unknown",
             status=ImageStatus.UPLOADED.value,
             size_bytes=file_size,
-            uploaded_at=image.uploaded_at,
+            uploaded_at=uploaded_at,
             message="Image uploaded successfully and queued for processing"
         )
         
@@ -76,6 +113,52 @@ async def upload_image(
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
+def create_duplicate(db: Session, original: Image, file_id: str, file_path: str,
+                     filename: str) -> ImageUploadResponse:
+    """
+    Record an upload whose content matches an already processed image. The
+    new image points at the original's files, so the copy just saved is
+    removed and nothing is published.
+    """
+    now = datetime.utcnow()
+    image = Image(
+        id=file_id,
+        original_filename=filename,
+        original_path=original.original_path,
+        original_size_bytes=original.original_size_bytes,
+        content_hash=original.content_hash,
+        status=ImageStatus.COMPLETED,
+        uploaded_at=now,
+        processed_at=now
+    )
+    image.thumbnails = [
+        Thumbnail(
+            size_name=thumbnail.size_name,
+            width=thumbnail.width,
+            height=thumbnail.height,
+            file_path=thumbnail.file_path,
+            file_size_bytes=thumbnail.file_size_bytes,
+            processing_time_ms=0
+        )
+        for thumbnail in original.thumbnails
+    ]
+    db.add(image)
+    db.commit()
+    
+    os.remove(file_path)
+    increment_counter("image.upload.deduplicated")
+    print(f"♻️ Image {file_id} duplicates {original.id}, reusing its thumbnails")
+    
+    return ImageUploadResponse(
+        id=file_id,
+        filename=filename,
+        status=ImageStatus.COMPLETED.value,
+        size_bytes=original.original_size_bytes,
+        uploaded_at=now,
+        message="Image already processed, thumbnails are ready"
+    )
+
+
 @router.get("/{image_id}/{size}")
 def download_thumbnail(
     image_id: str,
@@ -1,10 +1,17 @@
+import hashlib
 import os
+import tempfile
 import uuid
 from pathlib import Path
-from typing import Tuple
+from typing import BinaryIO, Optional, Tuple
 from fastapi import UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from shared.config import Config
 
+# Uploads are copied to disk in pieces of this size, so memory per upload is
+# bounded by the chunk rather than MAX_UPLOAD_SIZE_MB
+CHUNK_SIZE = 1024 * 1024
+
 
 ALLOWED_MIME_TYPES = {
     "image/jpeg",
@@ -31,7 +38,51 @@ def validate_image_file(file: UploadFile) -> None:
         )
 
 
-async def save_uploaded_file(file: UploadFile) -> Tuple[str, str, int]:
+def copy_upload(source: BinaryIO, upload_dir: Path, stored_filename: str, max_size: int,
+                hash_algorithm: Optional[str] = None) -> Tuple[str, int, Optional[str]]:
+    """
+    Copy an upload into upload_dir in CHUNK_SIZE pieces. Blocking, so call it
+    off the event loop.
+    
+    The bytes go to a hidden temp file in the same directory, which is renamed
+    into place once complete, so readers never see a partial upload. The copy
+    stops as soon as the upload exceeds max_size. Returns the final path, the
+    size and, when hash_algorithm is given, the hex digest of the content.
+    """
+    hasher = hashlib.new(hash_algorithm) if hash_algorithm else None
+    file_size = 0
+    
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=upload_dir, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := source.read(CHUNK_SIZE):
+                file_size += len(chunk)
+                if file_size > max_size:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"File too large. Max: {Config.MAX_UPLOAD_SIZE_MB}MB"
+                    )
+                if hasher:
+                    hasher.update(chunk)
+                f.write(chunk)
+        
+        file_path = upload_dir / stored_filename
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    
+    return str(file_path), file_size, hasher.hexdigest() if hasher else None
+
+
+async def save_uploaded_file(file: UploadFile,
+                             hash_algorithm: Optional[str] = None) -> Tuple[str, str, int, Optional[str]]:
+    """
+    Stream an upload to UPLOAD_DIR without holding it in memory.
+    Returns (file_id, file_path, file_size, content_hash); content_hash is
+    None unless hash_algorithm is given.
+    """
     validate_image_file(file)
     
     file_id = str(uuid.uuid4())
@@ -39,27 +90,18 @@ async def save_uploaded_file(file: UploadFile) -> Tuple[str, str, int]:
     extension = original_filename.split(".")[-1] if "." in original_filename else "jpg"
     stored_filename = f"{file_id}.{extension}"
     
-    upload_dir = Path(Config.UPLOAD_DIR)
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    
-    file_path = upload_dir / stored_filename
-    
     try:
-        content = await file.read()
-        file_size = len(content)
-        
-        max_size = Config.MAX_UPLOAD_SIZE_MB * 1024 * 1024
-        if file_size > max_size:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Max: {Config.MAX_UPLOAD_SIZE_MB}MB"
-            )
-        
-        with open(file_path, "wb") as f:
-            f.write(content)
+        file_path, file_size, content_hash = await run_in_threadpool(
+            copy_upload,
+            file.file,
+            Path(Config.UPLOAD_DIR),
+            stored_filename,
+            Config.MAX_UPLOAD_SIZE_MB * 1024 * 1024,
+            hash_algorithm
+        )
         
         print(f"✅ Saved: {stored_filename} ({file_size} bytes)")
-        return file_id, str(file_path), file_size
+        return file_id, file_path, file_size, content_hash
         
     except HTTPException:
         raise
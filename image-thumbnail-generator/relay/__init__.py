@@ -0,0 +1 @@
+# Outbox relay: publishes queued outbox messages to Pub/Sub
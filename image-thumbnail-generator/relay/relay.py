@@ -0,0 +1,97 @@
+import time
+from datetime import datetime, timedelta
+from shared.database import init_db, get_db, OutboxMessage
+from shared.pubsub_client import get_pubsub_client
+from shared.config import Config
+from shared.metrics import init_metrics, increment_counter, record_gauge, record_timing
+
+init_metrics()
+
+# Longest wait before retrying a message that failed to publish
+MAX_RETRY_DELAY_SECONDS = 60
+
+
+def relay_batch(db, pubsub_client) -> int:
+    """
+    Publish up to RELAY_BATCH_SIZE due outbox messages and delete the ones
+    Pub/Sub confirmed. Failed messages are retried after an exponential
+    backoff. Returns the number of messages attempted.
+    
+    Rows are locked with SKIP LOCKED until the batch commits, so several
+    relays can run side by side. A relay that dies between publishing and
+    committing leaves its rows in place to be published again: delivery is
+    at least once.
+    """
+    now = datetime.utcnow()
+    messages = (
+        db.query(OutboxMessage)
+        .filter(OutboxMessage.available_at <= now)
+        .order_by(OutboxMessage.id)
+        .limit(Config.RELAY_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not messages:
+        db.commit()
+        return 0
+    
+    results = pubsub_client.publish_batch([message.payload for message in messages],
+                                          timeout=Config.RELAY_PUBLISH_TIMEOUT_SECONDS)
+    
+    published = 0
+    last_error = None
+    for message, result in zip(messages, results):
+        if isinstance(result, Exception):
+            last_error = result
+            message.attempts += 1
+            message.available_at = datetime.utcnow() + timedelta(
+                seconds=min(2 ** (message.attempts - 1), MAX_RETRY_DELAY_SECONDS)
+            )
+            message.last_error = f"{type(result).__name__}: {result}"[:1024]
+            increment_counter("outbox.publish.count", tags=["status:error"])
+            continue
+        record_timing("outbox.lag", (now - message.created_at).total_seconds() * 1000)
+        db.delete(message)
+        published += 1
+    db.commit()
+    
+    increment_counter("outbox.publish.count", published, tags=["status:success"])
+    print(f"📤 Relayed {published}/{len(messages)} outbox message(s)")
+    if last_error is not None:
+        print(f"⚠️  {len(messages) - published} message(s) failed to publish, will retry: {type(last_error).__name__}: {last_error}")
+    return len(messages)
+
+
+def main():
+    print("🚀 Starting Outbox Relay...")
+    
+    init_db()
+    pubsub_client = get_pubsub_client()
+    
+    print(f"👂 Relaying outbox to {pubsub_client.topic_path}")
+    print(f"   Batch size: {Config.RELAY_BATCH_SIZE}, poll interval: {Config.RELAY_POLL_SECONDS}s")
+    
+    while True:
+        try:
+            db_gen = get_db()
+            db = next(db_gen)
+            try:
+                relayed = relay_batch(db, pubsub_client)
+                record_gauge("outbox.pending", db.query(OutboxMessage).count())
+            finally:
+                db_gen.close()
+            
+            # A full batch means more are probably waiting
+            if relayed < Config.RELAY_BATCH_SIZE:
+                time.sleep(Config.RELAY_POLL_SECONDS)
+        
+        except KeyboardInterrupt:
+            print("\n👋 Shutting down relay...")
+            break
+        except Exception as e:
+            print(f"❌ Relay error: {e}")
+            time.sleep(5)
+
+
+if __name__ == "__main__":
+    main()
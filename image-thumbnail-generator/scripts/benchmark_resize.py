@@ -0,0 +1,130 @@
+"""
+CPU time, throughput and peak memory of the thumbnail pipeline, against the
+previous one: a full-resolution copy and LANCZOS thumbnail() for every size.
+
+Each pipeline runs single-threaded in its own child process over the same
+corpus, so peak RSS is measured separately for each. The script then compares
+their thumbnails pixel by pixel, to show what the faster path costs in quality.
+
+    pip install -r worker/requirements.txt
+    python scripts/benchmark_resize.py
+    python scripts/benchmark_resize.py --images ~/Pictures/samples
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from PIL import Image, ImageChops, ImageStat  # noqa: E402
+from sample_corpus import add_corpus_arguments, build_corpus  # noqa: E402
+
+PIPELINES = ("copy-per-size", "draft-cascade")
+
+
+def copy_per_size(image_path: str, image_id: str, sizes: dict, thumbnail_dir: str):
+    """The pipeline before draft decoding and cascading, kept here as the baseline."""
+    extension = Path(image_path).suffix or ".jpg"
+    with Image.open(image_path) as original_image:
+        for size_name, (width, height) in sizes.items():
+            thumbnail = original_image.copy()
+            thumbnail.thumbnail((width, height), Image.Resampling.LANCZOS)
+            size_dir = Path(thumbnail_dir) / size_name
+            size_dir.mkdir(parents=True, exist_ok=True)
+            thumbnail.save(size_dir / f"{image_id}{extension}", quality=85, optimize=True)
+
+
+def peak_rss_mb() -> float:
+    # VmHWM starts over in every process; ru_maxrss can carry over the
+    # parent's peak on Linux, which here includes building the corpus
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(pipeline: str, paths: list):
+    # Single-threaded, so CPU time is comparable; set before Config is imported
+    os.environ["WORKER_COUNT"] = "1"
+    with contextlib.redirect_stdout(io.StringIO()):
+        from shared.config import Config, THUMBNAIL_SIZES
+        from worker.processors.image_processor import generate_thumbnails
+
+    start_rss_mb = peak_rss_mb()
+    start_cpu, start_wall = time.process_time(), time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, path in enumerate(paths):
+            if pipeline == "copy-per-size":
+                copy_per_size(path, f"image-{i}", THUMBNAIL_SIZES, Config.THUMBNAIL_DIR)
+            else:
+                generate_thumbnails(path, f"image-{i}")
+    print(json.dumps({
+        "cpu_ms_per_image": (time.process_time() - start_cpu) * 1000 / len(paths),
+        "images_per_second": len(paths) / (time.perf_counter() - start_wall),
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_growth_mb": peak_rss_mb() - start_rss_mb,
+    }))
+
+
+def mean_difference(baseline_dir: Path, candidate_dir: Path) -> dict:
+    """Worst mean absolute per-channel difference (0-255) per size between the two pipelines."""
+    worst = {}
+    for baseline_path in sorted(baseline_dir.glob("*/*")):
+        size_name = baseline_path.parent.name
+        with Image.open(baseline_path) as a, Image.open(candidate_dir / size_name / baseline_path.name) as b:
+            if a.size != b.size:
+                worst[size_name] = float("inf")
+                continue
+            diff = ImageStat.Stat(ImageChops.difference(a.convert("RGB"), b.convert("RGB"))).mean
+            worst[size_name] = max(worst.get(size_name, 0.0), sum(diff) / len(diff))
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_corpus_arguments(parser)
+    parser.add_argument("--child", choices=PIPELINES, help=argparse.SUPPRESS)
+    parser.add_argument("paths", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.paths)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="thumbnail-bench-") as scratch_dir:
+        paths = build_corpus(args, scratch_dir)
+        with Image.open(paths[0]) as sample:
+            print(f"{len(paths)} images, e.g. {sample.width}x{sample.height}\n")
+
+        results = {}
+        for pipeline in PIPELINES:
+            env = dict(os.environ, THUMBNAIL_DIR=str(Path(scratch_dir) / pipeline))
+            output = subprocess.run([sys.executable, __file__, "--child", pipeline, *paths],
+                                    env=env, capture_output=True, text=True, check=True).stdout
+            results[pipeline] = json.loads(output.strip().splitlines()[-1])
+
+        print(f"{'pipeline':<15} {'CPU ms/image':>13} {'images/s':>9} {'peak RSS MB':>12} {'RSS growth MB':>14}")
+        for pipeline, result in results.items():
+            print(f"{pipeline:<15} {result['cpu_ms_per_image']:>13.1f} {result['images_per_second']:>9.2f} "
+                  f"{result['peak_rss_mb']:>12.1f} {result['peak_rss_growth_mb']:>14.1f}")
+
+        differences = mean_difference(Path(scratch_dir) / PIPELINES[0], Path(scratch_dir) / PIPELINES[1])
+        print("\nWorst mean pixel difference from copy-per-size (0-255): "
+              + ", ".join(f"{size} {diff:.2f}" for size, diff in differences.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Thumbnail generation throughput: images per second versus core count.
+
+For each core count N, pins this process to N CPUs (on Linux) and runs
+generate_thumbnails() over a corpus with an N-thread thumbnail pool. It uses
+the JPEGs in --images, or generates --count synthetic ones of --megapixels.
+
+    pip install -r worker/requirements.txt
+    python scripts/benchmark_thumbnails.py --cores 1,2,4
+    python scripts/benchmark_thumbnails.py --images ~/Pictures/samples
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+# Thumbnails go to a scratch directory, which must be set before Config is imported
+scratch_dir = tempfile.TemporaryDirectory(prefix="thumbnail-bench-")
+os.environ["THUMBNAIL_DIR"] = scratch_dir.name
+
+from PIL import Image  # noqa: E402
+from sample_corpus import add_corpus_arguments, build_corpus  # noqa: E402
+from worker.processors.image_processor import generate_thumbnails  # noqa: E402
+
+
+def run(paths: list, cores: int, rounds: int) -> float:
+    # Keep the per-thumbnail log lines out of the results
+    with ThreadPoolExecutor(max_workers=cores) as executor, contextlib.redirect_stdout(io.StringIO()):
+        generate_thumbnails(paths[0], "warmup", executor)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for i, path in enumerate(paths):
+                generate_thumbnails(path, f"bench-{i}", executor)
+        return rounds * len(paths) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cores", default=",".join(str(n) for n in (1, 2, 4, 8) if n <= (os.cpu_count() or 1)),
+                        help="comma-separated core counts (default: powers of two up to the CPU count)")
+    add_corpus_arguments(parser)
+    parser.add_argument("--rounds", type=int, default=2, help="passes over the corpus per core count")
+    args = parser.parse_args()
+
+    paths = build_corpus(args, scratch_dir.name)
+    with Image.open(paths[0]) as sample:
+        print(f"{len(paths)} images, e.g. {sample.width}x{sample.height}; "
+              f"{os.cpu_count()} CPUs available\n")
+
+    all_cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+    baseline = None
+    print(f"{'cores':>5} {'images/s':>10} {'speedup':>8}")
+    for cores in [int(n) for n in args.cores.split(",")]:
+        if all_cpus is not None:
+            os.sched_setaffinity(0, all_cpus[:cores])
+        throughput = run(paths, cores, args.rounds)
+        baseline = baseline or throughput
+        print(f"{cores:>5} {throughput:>10.2f} {throughput / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+API memory under concurrent uploads: the streaming save_uploaded_file()
+against reading each upload into memory before writing it, as it used to.
+
+For each mode, starts a minimal FastAPI app under uvicorn that only saves
+uploads (no database or Pub/Sub). It then fires --concurrency parallel
+uploads of --size-mb each and samples the server's RSS while they are in
+flight.
+
+    pip install -r api/requirements.txt psutil
+    python scripts/benchmark_uploads.py --concurrency 200 --size-mb 5
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+MODES = ("read-all", "streaming")
+
+
+def serve(mode: str, port: int):
+    import uvicorn
+    from fastapi import FastAPI, File, UploadFile
+    from api.storage.file_handler import save_uploaded_file, validate_image_file
+    from shared.config import Config
+
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        if mode == "streaming":
+            _, _, file_size, _ = await save_uploaded_file(file, hash_algorithm="sha256")
+        else:
+            validate_image_file(file)
+            content = await file.read()
+            file_size = len(content)
+            with open(Path(Config.UPLOAD_DIR) / f"{time.time_ns()}.jpg", "wb") as f:
+                f.write(content)
+        return {"size": file_size}
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class RssSampler(threading.Thread):
+    """Polls a process's RSS and keeps the peak."""
+
+    def __init__(self, pid: int, interval: float = 0.02):
+        super().__init__(daemon=True)
+        import psutil
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak = self.process.memory_info().rss
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+async def upload_all(url: str, payload: bytes, concurrency: int) -> list:
+    import httpx
+
+    latencies = []
+
+    async def upload_group(count: int):
+        # Small pools: httpx scans its pool per request
+        async with httpx.AsyncClient(timeout=300, limits=httpx.Limits(max_connections=count)) as client:
+            async def upload_one():
+                start = time.perf_counter()
+                response = await client.post(url, files={"file": ("bench.jpg", payload, "image/jpeg")})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            await asyncio.gather(*(upload_one() for _ in range(count)))
+
+    await asyncio.gather(*(upload_group(min(25, concurrency - i)) for i in range(0, concurrency, 25)))
+    return sorted(latencies)
+
+
+def run_mode(mode: str, payload: bytes, concurrency: int) -> dict:
+    import httpx
+
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix="upload-bench-") as upload_dir:
+        env = dict(os.environ, UPLOAD_DIR=upload_dir)
+        server = subprocess.Popen([sys.executable, __file__, "--serve", mode, "--port", str(port)],
+                                  env=env, stdout=subprocess.DEVNULL)
+        try:
+            for _ in range(100):
+                try:
+                    httpx.get(f"http://127.0.0.1:{port}/docs")
+                    break
+                except httpx.HTTPError:
+                    time.sleep(0.1)
+            sampler = RssSampler(server.pid)
+            idle_rss = sampler.peak
+            sampler.start()
+            start = time.perf_counter()
+            latencies = asyncio.run(upload_all(f"http://127.0.0.1:{port}/upload", payload, concurrency))
+            elapsed = time.perf_counter() - start
+            sampler.stop()
+        finally:
+            server.terminate()
+            server.wait()
+
+    return {
+        "uploads_per_second": concurrency / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "idle_rss_mb": idle_rss / 1024 / 1024,
+        "peak_rss_mb": sampler.peak / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=200, help="parallel uploads (default: 200)")
+    parser.add_argument("--size-mb", type=float, default=5, help="size of each upload (default: 5)")
+    parser.add_argument("--serve", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    payload = os.urandom(int(args.size_mb * 1024 * 1024))
+    print(f"{args.concurrency} parallel uploads of {args.size_mb}MB\n")
+    print(f"{'mode':<10} {'uploads/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'idle RSS MB':>12} {'peak RSS MB':>12}")
+    for mode in MODES:
+        result = run_mode(mode, payload, args.concurrency)
+        print(f"{mode:<10} {result['uploads_per_second']:>10.1f} {result['p50_ms']:>9.0f} {result['p99_ms']:>9.0f} "
+              f"{result['idle_rss_mb']:>12.1f} {result['peak_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
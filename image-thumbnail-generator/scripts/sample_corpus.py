@@ -0,0 +1,38 @@
+"""
+Image corpus for the thumbnail benchmarks: a directory of sample images
+(--images), or --count synthetic JPEGs of --megapixels.
+"""
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument("--images", help="directory of sample images to use as the corpus")
+    parser.add_argument("--count", type=int, default=8, help="synthetic images to generate (default: 8)")
+    parser.add_argument("--megapixels", type=float, default=12, help="size of synthetic images (default: 12)")
+
+
+def build_corpus(args, scratch_dir: str) -> list:
+    if args.images:
+        paths = sorted(str(p) for p in Path(args.images).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        if not paths:
+            sys.exit(f"No images found in {args.images}")
+        return paths
+
+    corpus_dir = Path(scratch_dir) / "corpus"
+    corpus_dir.mkdir()
+    width = int((args.megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    paths = []
+    for i in range(args.count):
+        path = corpus_dir / f"sample-{i}.jpg"
+        # Noise over a gradient compresses roughly like a photo
+        noise = Image.effect_noise((width, height), 40 + i).convert("RGB")
+        gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+        Image.blend(noise, gradient, 0.5).save(path, "JPEG", quality=90)
+        paths.append(str(path))
+    return paths
@@ -15,6 +15,8 @@ class Config:
     PUBSUB_PROJECT_ID = os.getenv("PUBSUB_PROJECT_ID", "image-thumbnail-project")
     PUBSUB_EMULATOR_HOST = os.getenv("PUBSUB_EMULATOR_HOST", "localhost:8085")
     PUBSUB_TOPIC = os.getenv("PUBSUB_TOPIC", "image-processing-tasks")
+    PUBLISH_BATCH_MAX_MESSAGES = int(os.getenv("PUBLISH_BATCH_MAX_MESSAGES", "100"))
+    PUBLISH_BATCH_MAX_LATENCY_SECONDS = float(os.getenv("PUBLISH_BATCH_MAX_LATENCY_SECONDS", "0.05"))
     
     # Storage paths
     UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/app/storage/uploads")
@@ -23,6 +25,7 @@ class Config:
     # Image processing
     MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", "10"))
     ALLOWED_EXTENSIONS = os.getenv("ALLOWED_EXTENSIONS", "jpg,jpeg,png,gif,webp").split(",")
+    DEDUP_UPLOADS = os.getenv("DEDUP_UPLOADS", "true").lower() == "true"
     
     # Thumbnail sizes configuration
     @staticmethod
@@ -44,7 +47,20 @@ class Config:
     # Worker
     WORKER_COUNT = int(os.getenv("WORKER_COUNT", "2"))
     BATCH_SIZE = int(os.getenv("BATCH_SIZE", "1"))
+    MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "4"))
     WORKER_SLEEP_SECONDS = float(os.getenv("WORKER_SLEEP_SECONDS", "0.1"))
+    ACK_DEADLINE_SECONDS = int(os.getenv("ACK_DEADLINE_SECONDS", "60"))
+    MAX_LEASE_SECONDS = int(os.getenv("MAX_LEASE_SECONDS", "600"))
+    ACK_BATCH_SIZE = int(os.getenv("ACK_BATCH_SIZE", "100"))
+    ACK_FLUSH_SECONDS = float(os.getenv("ACK_FLUSH_SECONDS", "0.1"))
+    SUBSCRIBER_MODE = os.getenv("SUBSCRIBER_MODE", "pull")  # pull | streaming
+    FLOW_CONTROL_MAX_BYTES = int(os.getenv("FLOW_CONTROL_MAX_BYTES", str(100 * 1024 * 1024)))
+    
+    # Outbox relay
+    RELAY_BATCH_SIZE = int(os.getenv("RELAY_BATCH_SIZE", "100"))
+    RELAY_POLL_SECONDS = float(os.getenv("RELAY_POLL_SECONDS", "0.2"))
+    RELAY_PUBLISH_TIMEOUT_SECONDS = float(os.getenv("RELAY_PUBLISH_TIMEOUT_SECONDS", "30"))
+    OUTBOX_MAX_AGE_SECONDS = float(os.getenv("OUTBOX_MAX_AGE_SECONDS", "60"))  # /health reports the outbox as lagging past this
     
     # Datadog
     DD_AGENT_HOST = os.getenv("DD_AGENT_HOST", "datadog-agent")
@@ -52,6 +68,7 @@ class Config:
     DD_ENV = os.getenv("DD_ENV", "development")
     DD_SERVICE_API = os.getenv("DD_SERVICE_API", "image-api")
     DD_SERVICE_WORKER = os.getenv("DD_SERVICE_WORKER", "image-worker")
+    DD_SERVICE_RELAY = os.getenv("DD_SERVICE_RELAY", "image-outbox-relay")
     DD_TRACE_ENABLED = os.getenv("DD_TRACE_ENABLED", "false").lower() == "true"
     DD_API_KEY = os.getenv("DD_API_KEY", "")
     
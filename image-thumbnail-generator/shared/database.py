@@ -2,7 +2,7 @@
 Database models and connection setup for image thumbnail generator.
 """
 from datetime import datetime
-from sqlalchemy import create_engine, Column, String, Integer, BigInteger, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import create_engine, inspect, text, Column, String, Text, Integer, BigInteger, DateTime, ForeignKey, UniqueConstraint, Enum as SQLEnum
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 import enum
@@ -27,8 +27,10 @@ class Image(Base):
     original_filename = Column(String(255), nullable=False)
     original_path = Column(String(512), nullable=False)
     original_size_bytes = Column(BigInteger, nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of the original, for dedup
     status = Column(SQLEnum(ImageStatus), nullable=False, default=ImageStatus.UPLOADED)
     uploaded_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    processing_started_at = Column(DateTime, nullable=True)  # When a worker last claimed it
     processed_at = Column(DateTime, nullable=True)
     error_message = Column(String(1024), nullable=True)
     
@@ -42,6 +44,10 @@ class Image(Base):
 class Thumbnail(Base):
     """Generated thumbnail record."""
     __tablename__ = "thumbnails"
+    __table_args__ = (
+        # One thumbnail per size, however often a task is delivered
+        UniqueConstraint("image_id", "size_name", name="uq_thumbnails_image_size"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     image_id = Column(String(36), ForeignKey("images.id"), nullable=False)
@@ -60,6 +66,24 @@ class Thumbnail(Base):
         return f"<Thumbnail(id={self.id}, image_id={self.image_id}, size={self.size_name})>"
 
 
+class OutboxMessage(Base):
+    """
+    Pub/Sub message waiting to be published. Written in the same transaction
+    as the change it announces and deleted by the relay once published.
+    """
+    __tablename__ = "outbox"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    payload = Column(Text, nullable=False)  # JSON message body
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)  # Not retried before this time
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String(1024), nullable=True)
+    
+    def __repr__(self):
+        return f"<OutboxMessage(id={self.id}, attempts={self.attempts})>"
+
+
 engine = None
 SessionLocal = None
 
@@ -78,9 +102,44 @@ def init_db():
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     
     Base.metadata.create_all(bind=engine)
+    migrate_db()
     print("✅ Database initialized successfully")
 
 
+def migrate_db():
+    """
+    Bring tables created by an earlier version up to date. create_all() only
+    creates missing tables, so columns and constraints added since are added
+    here; every statement is a no-op once applied, so the API and worker can
+    both run it.
+    """
+    # ALTER TABLE waits for an exclusive lock even when there is nothing to
+    # do, so the schema is inspected first and only missing pieces are added
+    inspector = inspect(engine)
+    image_columns = {column["name"] for column in inspector.get_columns("images")}
+    if "content_hash" not in image_columns:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE images ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)"))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS ix_images_content_hash ON images (content_hash)"))
+    if "processing_started_at" not in image_columns:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE images ADD COLUMN IF NOT EXISTS processing_started_at TIMESTAMP"))
+    
+    # New tables get a unique constraint, migrated ones the equivalent index
+    thumbnail_uniques = {index["name"] for index in inspector.get_indexes("thumbnails")} | {
+        constraint["name"] for constraint in inspector.get_unique_constraints("thumbnails")}
+    if "uq_thumbnails_image_size" not in thumbnail_uniques:
+        with engine.begin() as connection:
+            # Earlier versions could record a size twice; keep the first row
+            connection.execute(text(
+                "DELETE FROM thumbnails t USING thumbnails d "
+                "WHERE t.image_id = d.image_id AND t.size_name = d.size_name AND t.id > d.id"
+            ))
+            connection.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_thumbnails_image_size ON thumbnails (image_id, size_name)"
+            ))
+
+
 def get_db():
     """Get database session (dependency for FastAPI)."""
     if SessionLocal is None:
@@ -1,4 +1,6 @@
 import os
+import time
+from contextlib import contextmanager
 from ddtrace import tracer
 from datadog import initialize, statsd
 
@@ -46,3 +48,12 @@ def record_timing(metric_name: str, value: float, tags: list = None):
         return
     statsd.timing(metric_name, value, tags=tags or [])
 
+
+@contextmanager
+def timed(metric_name: str, tags: list = None):
+    """Record how long the block took, in milliseconds, as a timing."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(metric_name, (time.perf_counter() - start) * 1000, tags=tags)
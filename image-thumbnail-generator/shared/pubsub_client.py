@@ -3,9 +3,16 @@ Google Pub/Sub client wrapper for message publishing and consuming.
 """
 import os
 import json
-from typing import Dict, Any, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Union
+from google.api_core import exceptions as api_exceptions
 from google.cloud import pubsub_v1
+from google.cloud.pubsub_v1.subscriber.futures import StreamingPullFuture
+from google.cloud.pubsub_v1.subscriber.scheduler import ThreadScheduler
 from shared.config import Config
+from shared.metrics import increment_counter, timed
 
 
 class PubSubClient:
@@ -19,8 +26,14 @@ class PubSubClient:
         self.project_id = Config.PUBSUB_PROJECT_ID
         self.topic_name = Config.PUBSUB_TOPIC
         
-        # Initialize publisher and subscriber
-        self.publisher = pubsub_v1.PublisherClient()
+        # Initialize publisher and subscriber; publishes made within the
+        # batch latency of each other go out in one request
+        self.publisher = pubsub_v1.PublisherClient(
+            batch_settings=pubsub_v1.types.BatchSettings(
+                max_messages=Config.PUBLISH_BATCH_MAX_MESSAGES,
+                max_latency=Config.PUBLISH_BATCH_MAX_LATENCY_SECONDS,
+            )
+        )
         self.subscriber = pubsub_v1.SubscriberClient()
         
         # Topic and subscription paths
@@ -48,7 +61,7 @@ class PubSubClient:
                 request={
                     "name": self.subscription_path,
                     "topic": self.topic_path,
-                    "ack_deadline_seconds": 60
+                    "ack_deadline_seconds": Config.ACK_DEADLINE_SECONDS
                 }
             )
             print(f"✅ Created subscription: {self.subscription_name}")
@@ -78,6 +91,28 @@ class PubSubClient:
         print(f"📤 Published message: {message_id}")
         return message_id
     
+    def publish_batch(self, payloads: List[str], timeout: float = 30.0) -> List[Union[str, Exception]]:
+        """
+        Publish already serialized JSON messages together; the publisher's
+        batch settings send them in as few requests as possible.
+        
+        Args:
+            payloads: JSON strings to publish
+            timeout: Seconds to wait for all of them to be confirmed
+            
+        Returns:
+            Per payload, its message ID or the exception that failed it
+        """
+        futures = [self.publisher.publish(self.topic_path, payload.encode("utf-8")) for payload in payloads]
+        deadline = time.monotonic() + timeout
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except Exception as e:
+                results.append(e)
+        return results
+    
     def pull_messages(self, max_messages: int = 1, timeout: float = 5.0):
         """
         Pull messages from subscription (synchronous).
@@ -87,7 +122,10 @@ class PubSubClient:
             timeout: Timeout in seconds
             
         Returns:
-            List of received messages
+            List of received messages, empty if none arrived within the timeout
+            
+        Raises:
+            google.api_core.exceptions.GoogleAPICallError: The pull failed
         """
         try:
             response = self.subscriber.pull(
@@ -97,42 +135,245 @@ class PubSubClient:
                 },
                 timeout=timeout,
             )
-            
-            return response.received_messages
-        except Exception as e:
-            # Timeout or no messages is normal
+        except api_exceptions.DeadlineExceeded:
+            # No messages before the timeout is normal
             return []
+        
+        return response.received_messages
     
-    def acknowledge_message(self, ack_id: str):
+    def subscribe(self, callback: Callable, executor: Optional[ThreadPoolExecutor] = None,
+                  max_messages: int = Config.MAX_IN_FLIGHT, max_bytes: int = Config.FLOW_CONTROL_MAX_BYTES,
+                  max_lease_seconds: int = Config.MAX_LEASE_SECONDS) -> StreamingPullFuture:
         """
-        Acknowledge a message (removes it from queue).
+        Receive messages over a streaming pull instead of polling.
+        
+        The client library calls callback(message) on executor for each
+        message, keeps at most max_messages and max_bytes outstanding, extends
+        their ack deadlines for up to max_lease_seconds and batches acks and
+        nacks itself.
         
         Args:
-            ack_id: Acknowledgment ID from received message
+            callback: Called with each message; must ack() or nack() it
+            executor: Runs the callbacks (default: the library's own pool)
+            max_messages: Messages leased but not yet acked or nacked
+            max_bytes: Total size of those messages
+            max_lease_seconds: How long a message is kept leased at most
+            
+        Returns:
+            Future of the stream; cancel() it to stop receiving
+        """
+        flow_control = pubsub_v1.types.FlowControl(
+            max_messages=max_messages,
+            max_bytes=max_bytes,
+            max_lease_duration=max_lease_seconds,
+        )
+        return self.subscriber.subscribe(
+            self.subscription_path,
+            callback,
+            flow_control=flow_control,
+            scheduler=ThreadScheduler(executor) if executor else None,
+            await_callbacks_on_shutdown=True,
+        )
+    
+    def acknowledge_messages(self, ack_ids: List[str]):
+        """
+        Acknowledge messages in one request (removes them from queue).
+        
+        Args:
+            ack_ids: Acknowledgment IDs from received messages
         """
         self.subscriber.acknowledge(
             request={
                 "subscription": self.subscription_path,
-                "ack_ids": [ack_id],
+                "ack_ids": ack_ids,
             }
         )
-        print(f"✅ Acknowledged message")
+        print(f"✅ Acknowledged {len(ack_ids)} message(s)")
     
-    def nack_message(self, ack_id: str):
+    def nack_messages(self, ack_ids: List[str]):
         """
-        Negative acknowledge a message (requeue for retry).
+        Negative acknowledge messages in one request (requeue for retry).
         
         Args:
-            ack_id: Acknowledgment ID from received message
+            ack_ids: Acknowledgment IDs from received messages
         """
         self.subscriber.modify_ack_deadline(
             request={
                 "subscription": self.subscription_path,
-                "ack_ids": [ack_id],
+                "ack_ids": ack_ids,
                 "ack_deadline_seconds": 0,  # Requeue immediately
             }
         )
-        print(f"↩️  Requeued message for retry")
+        print(f"↩️  Requeued {len(ack_ids)} message(s) for retry")
+    
+    def acknowledge_message(self, ack_id: str):
+        """Acknowledge a single message; see acknowledge_messages()."""
+        self.acknowledge_messages([ack_id])
+    
+    def nack_message(self, ack_id: str):
+        """Negative acknowledge a single message; see nack_messages()."""
+        self.nack_messages([ack_id])
+    
+    def extend_ack_deadline(self, ack_ids: list, seconds: int):
+        """
+        Push back the ack deadline of messages that are still being processed.
+        
+        Args:
+            ack_ids: Acknowledgment IDs of the in-flight messages
+            seconds: New deadline, counted from now
+        """
+        self.subscriber.modify_ack_deadline(
+            request={
+                "subscription": self.subscription_path,
+                "ack_ids": ack_ids,
+                "ack_deadline_seconds": seconds,
+            }
+        )
+
+
+class LeaseManager:
+    """
+    Keeps in-flight messages leased while they are processed.
+    
+    Every third of the ack deadline, the deadline of every registered message
+    is extended, so long jobs are not redelivered to another worker halfway
+    through. A message held longer than max_lease_seconds is no longer
+    extended and will be redelivered, so a stuck job cannot hold it forever.
+    """
+    
+    def __init__(self, pubsub_client: PubSubClient, deadline_seconds: int = Config.ACK_DEADLINE_SECONDS,
+                 max_lease_seconds: int = Config.MAX_LEASE_SECONDS):
+        self.pubsub_client = pubsub_client
+        self.deadline_seconds = deadline_seconds
+        self.max_lease_seconds = max_lease_seconds
+        self._leased = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="lease-manager", daemon=True)
+        self._thread.start()
+    
+    def add(self, ack_id: str):
+        with self._lock:
+            self._leased[ack_id] = time.monotonic()
+    
+    def remove(self, ack_id: str):
+        with self._lock:
+            self._leased.pop(ack_id, None)
+    
+    def _run(self):
+        while not self._stop.wait(self.deadline_seconds / 3):
+            now = time.monotonic()
+            with self._lock:
+                expired = [ack_id for ack_id, leased_at in self._leased.items()
+                           if now - leased_at > self.max_lease_seconds]
+                for ack_id in expired:
+                    del self._leased[ack_id]
+                ack_ids = list(self._leased)
+            if expired:
+                print(f"⚠️  Stopped extending {len(expired)} message(s) held over {self.max_lease_seconds}s")
+            if not ack_ids:
+                continue
+            try:
+                self.pubsub_client.extend_ack_deadline(ack_ids, self.deadline_seconds)
+            except Exception as e:
+                print(f"⚠️  Error extending ack deadlines: {e}")
+    
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class AckBatcher:
+    """
+    Collects acks and nacks and sends each kind in as few requests as possible.
+    
+    Pending IDs are flushed once max_batch of them are waiting, or max_delay
+    seconds after the first one was added, whichever comes first, and on
+    close(). Acks are best effort: if a request fails, Pub/Sub redelivers the
+    messages once their ack deadline passes.
+    """
+    
+    # Pub/Sub caps a request at 512KB, and an ack ID can be a few hundred bytes
+    MAX_IDS_PER_REQUEST = 1000
+    
+    def __init__(self, pubsub_client: PubSubClient, max_batch: int = Config.ACK_BATCH_SIZE,
+                 max_delay: float = Config.ACK_FLUSH_SECONDS):
+        self.pubsub_client = pubsub_client
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._acks = []
+        self._nacks = []
+        self._first_added_at = None
+        self._closed = False
+        self._changed = threading.Condition()
+        self._thread = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ack-batcher", daemon=True)
+        self._thread.start()
+    
+    def ack(self, ack_id: str):
+        self._add(self._acks, ack_id)
+    
+    def nack(self, ack_id: str):
+        self._add(self._nacks, ack_id)
+    
+    def _add(self, pending: list, ack_id: str):
+        with self._changed:
+            pending.append(ack_id)
+            waiting = len(self._acks) + len(self._nacks)
+            if waiting == 1:
+                self._first_added_at = time.monotonic()
+            # The flush thread only needs waking to start a timer or send a full batch
+            if waiting == 1 or waiting >= self.max_batch:
+                self._changed.notify()
+    
+    def _run(self):
+        while True:
+            with self._changed:
+                while not self._closed:
+                    waiting = len(self._acks) + len(self._nacks)
+                    if waiting >= self.max_batch:
+                        break
+                    if not waiting:
+                        self._changed.wait()
+                        continue
+                    remaining = self._first_added_at + self.max_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+                acks, self._acks = self._acks, []
+                nacks, self._nacks = self._nacks, []
+                closed = self._closed
+            
+            self._send(self.pubsub_client.acknowledge_messages, acks, "ack")
+            self._send(self.pubsub_client.nack_messages, nacks, "nack")
+            if closed:
+                return
+    
+    def _send(self, send: Callable, ack_ids: list, kind: str):
+        for start in range(0, len(ack_ids), self.MAX_IDS_PER_REQUEST):
+            chunk = ack_ids[start:start + self.MAX_IDS_PER_REQUEST]
+            try:
+                with timed("worker.stage.time", tags=[f"stage:{kind}"]):
+                    send(chunk)
+                increment_counter("worker.ack.count", len(chunk), tags=[f"type:{kind}", "status:success"])
+            except Exception as e:
+                # Once their ack deadline passes, Pub/Sub redelivers the messages anyway
+                print(f"❌ Error sending {len(chunk)} {kind}(s): {e}")
+                increment_counter("worker.ack.count", len(chunk), tags=[f"type:{kind}", "status:error"])
+    
+    def close(self):
+        """Send whatever is pending, then stop."""
+        with self._changed:
+            self._closed = True
+            self._changed.notify()
+        if self._thread is not None:
+            self._thread.join()
 
 
 # Singleton instance
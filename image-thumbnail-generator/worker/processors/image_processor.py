@@ -1,48 +1,132 @@
+import math
 import os
+import threading
 import time
+from concurrent.futures import Executor, ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional, Tuple
 from PIL import Image
 from shared.config import Config, THUMBNAIL_SIZES
+from shared.metrics import record_timing
 
+# Every resize shrinks its source by at least this factor: the JPEG decoder
+# is asked for this much headroom over the largest thumbnail, and each smaller
+# thumbnail is cut from the previous one when that is still this much larger.
+# Below about 2x, LANCZOS from a resampled image starts to look soft.
+DOWNSCALE_HEADROOM = 2.0
 
-def generate_thumbnails(image_path: str, image_id: str) -> list:
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> Optional[ThreadPoolExecutor]:
+    """
+    Thread pool that encodes and saves the sizes of an image in parallel, sized
+    from Config.WORKER_COUNT (None when that is 1). Pillow releases the GIL
+    while it encodes, so the saves run on separate cores.
+    """
+    global _executor
+    if Config.WORKER_COUNT <= 1:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.WORKER_COUNT, thread_name_prefix="thumbnail")
+        return _executor
+
+
+def fit_within(size: Tuple[int, int], box: Tuple[int, int]) -> Tuple[int, int]:
+    """Largest size with the aspect ratio of ``size`` that fits in ``box``, rounded like Image.thumbnail()."""
+    width, height = size
+    max_width, max_height = box
+    if max_width >= width and max_height >= height:
+        return width, height
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+    if max_width / max_height >= aspect:
+        return round_aspect(max_height * aspect, key=lambda n: abs(aspect - n / max_height)), max_height
+    return max_width, round_aspect(max_width / aspect, key=lambda n: 0 if n == 0 else abs(aspect - max_width / n))
+
+
+def save_thumbnail(thumbnail: Image.Image, image_id: str, extension: str, size_name: str,
+                   resize_time_ms: float) -> tuple:
+    """Encode and save one rendered thumbnail."""
+    start_time = time.time()
+
+    thumbnail_dir = Path(Config.THUMBNAIL_DIR) / size_name
+    thumbnail_dir.mkdir(parents=True, exist_ok=True)
+    thumbnail_path = thumbnail_dir / f"{image_id}{extension}"
+
+    thumbnail.save(thumbnail_path, quality=85, optimize=True)
+
+    processing_time_ms = int(resize_time_ms + (time.time() - start_time) * 1000)
+    file_size = os.path.getsize(thumbnail_path)
+
+    print(f"✅ Generated {size_name}: {thumbnail.width}x{thumbnail.height} ({processing_time_ms}ms)")
+
+    return (
+        size_name,
+        thumbnail.width,
+        thumbnail.height,
+        str(thumbnail_path),
+        file_size,
+        processing_time_ms
+    )
+
+
+def generate_thumbnails(image_path: str, image_id: str, executor: Optional[Executor] = None) -> list:
     """
     Generate thumbnails for an image.
+    JPEGs are decoded at the smallest 1/2, 1/4 or 1/8 scale that still leaves
+    DOWNSCALE_HEADROOM over the largest size. Sizes are then resized
+    largest-first, each from the smallest image so far that is at least
+    DOWNSCALE_HEADROOM times bigger, and saved on ``executor`` (default:
+    get_executor()) while the next size is resized.
     Returns list of tuples: (size_name, width, height, file_path, file_size_bytes, processing_time_ms)
     """
     if not os.path.exists(image_path):
         raise FileNotFoundError(f"Image not found: {image_path}")
-    
-    results = []
-    original_image = Image.open(image_path)
+
     extension = Path(image_path).suffix or ".jpg"
-    
-    for size_name, (width, height) in THUMBNAIL_SIZES.items():
-        start_time = time.time()
-        
-        thumbnail = original_image.copy()
-        thumbnail.thumbnail((width, height), Image.Resampling.LANCZOS)
-        
-        thumbnail_dir = Path(Config.THUMBNAIL_DIR) / size_name
-        thumbnail_dir.mkdir(parents=True, exist_ok=True)
-        thumbnail_path = thumbnail_dir / f"{image_id}{extension}"
-        
-        thumbnail.save(thumbnail_path, quality=85, optimize=True)
-        
-        processing_time_ms = int((time.time() - start_time) * 1000)
-        file_size = os.path.getsize(thumbnail_path)
-        
-        results.append((
-            size_name,
-            thumbnail.width,
-            thumbnail.height,
-            str(thumbnail_path),
-            file_size,
-            processing_time_ms
-        ))
-        
-        print(f"✅ Generated {size_name}: {thumbnail.width}x{thumbnail.height} ({processing_time_ms}ms)")
-    
-    original_image.close()
-    return results
+    executor = executor or get_executor()
+    sizes = sorted(THUMBNAIL_SIZES.items(), key=lambda item: item[1][0] * item[1][1], reverse=True)
+
+    decode_start = time.perf_counter()
+    with Image.open(image_path) as original_image:
+        original_size = original_image.size
+        largest = fit_within(original_size, sizes[0][1])
+        # A no-op for formats other than JPEG; Image.size shrinks to the decoded scale
+        original_image.draft(None, (int(largest[0] * DOWNSCALE_HEADROOM), int(largest[1] * DOWNSCALE_HEADROOM)))
+        original_image.load()
+        resize_start = time.perf_counter()
+        record_timing("worker.stage.time", (resize_start - decode_start) * 1000, tags=["stage:decode"])
+
+        sources = [original_image]
+        results = []
+        for size_name, box in sizes:
+            start_time = time.time()
+            target = fit_within(original_size, box)
+            source = next(
+                (image for image in reversed(sources)
+                 if image.width >= target[0] * DOWNSCALE_HEADROOM and image.height >= target[1] * DOWNSCALE_HEADROOM),
+                original_image
+            )
+            if source.size == target:
+                thumbnail = source.copy()
+            else:
+                thumbnail = source.resize(target, Image.Resampling.LANCZOS)
+            sources.append(thumbnail)
+            resize_time_ms = (time.time() - start_time) * 1000
+
+            if executor is None:
+                results.append(save_thumbnail(thumbnail, image_id, extension, size_name, resize_time_ms))
+            else:
+                results.append(executor.submit(save_thumbnail, thumbnail, image_id, extension, size_name,
+                                               resize_time_ms))
 
+        if executor is not None:
+            results = [result.result() for result in results]
+        record_timing("worker.stage.time", (time.perf_counter() - resize_start) * 1000, tags=["stage:resize"])
+        return results
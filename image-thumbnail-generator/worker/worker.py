@@ -1,10 +1,15 @@
 import json
+import threading
 import time
-from datetime import datetime
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 from shared.database import init_db, get_db, Image, Thumbnail, ImageStatus
-from shared.pubsub_client import get_pubsub_client
+from shared.pubsub_client import get_pubsub_client, AckBatcher, LeaseManager
 from shared.config import Config
-from shared.metrics import init_metrics, increment_counter, record_histogram, record_timing
+from shared.metrics import init_metrics, increment_counter, record_gauge, record_histogram, record_timing, timed
 from worker.processors.image_processor import generate_thumbnails
 
 init_metrics()
@@ -18,36 +23,64 @@ def process_image_message(message_data: dict, db):
     print(f"🔄 Processing image: {image_id}")
     start_time = time.time()
     
-    image = db.query(Image).filter(Image.id == image_id).first()
-    if not image:
-        print(f"❌ Image not found in database: {image_id}")
-        increment_counter("worker.process.count", tags=["status:error", "reason:not_found"])
-        return False
-    
-    image.status = ImageStatus.PROCESSING
-    db.commit()
+    with timed("worker.stage.time", tags=["stage:db"]):
+        # Tasks are delivered at least once, so the image is claimed in one
+        # UPDATE: only one delivery at a time gets to process it. A live
+        # claim holder keeps its lease, so a redelivery after a full ack
+        # deadline means the claim was abandoned (e.g. the worker crashed);
+        # if it was not, the unique thumbnail sizes stop a second set of rows.
+        now = datetime.utcnow()
+        claimed = db.query(Image).filter(
+            Image.id == image_id,
+            or_(
+                Image.status.in_([ImageStatus.UPLOADED, ImageStatus.FAILED]),
+                and_(Image.status == ImageStatus.PROCESSING,
+                     or_(Image.processing_started_at.is_(None),
+                         Image.processing_started_at < now - timedelta(seconds=Config.ACK_DEADLINE_SECONDS))),
+            ),
+        ).update({Image.status: ImageStatus.PROCESSING, Image.processing_started_at: now},
+                 synchronize_session=False)
+        db.commit()
+        
+        image = db.query(Image).filter(Image.id == image_id).first()
+        if not image:
+            print(f"❌ Image not found in database: {image_id}")
+            increment_counter("worker.process.count", tags=["status:error", "reason:not_found"])
+            return False
+        
+        if not claimed:
+            if image.status == ImageStatus.COMPLETED:
+                print(f"ℹ️  Image already processed, skipping duplicate task: {image_id}")
+                increment_counter("worker.process.count", tags=["status:skipped", "reason:duplicate"])
+                return True
+            # Another delivery is processing it; nacked so the task comes
+            # back if that one fails
+            print(f"ℹ️  Image is being processed by another delivery: {image_id}")
+            increment_counter("worker.process.count", tags=["status:skipped", "reason:in_progress"])
+            return False
     
     try:
         thumbnails = generate_thumbnails(file_path, image_id)
         
-        for size_name, width, height, thumb_path, file_size, proc_time_ms in thumbnails:
-            thumbnail = Thumbnail(
-                image_id=image_id,
-                size_name=size_name,
-                width=width,
-                height=height,
-                file_path=thumb_path,
-                file_size_bytes=file_size,
-                processing_time_ms=proc_time_ms
-            )
-            db.add(thumbnail)
+        with timed("worker.stage.time", tags=["stage:db"]):
+            for size_name, width, height, thumb_path, file_size, proc_time_ms in thumbnails:
+                thumbnail = Thumbnail(
+                    image_id=image_id,
+                    size_name=size_name,
+                    width=width,
+                    height=height,
+                    file_path=thumb_path,
+                    file_size_bytes=file_size,
+                    processing_time_ms=proc_time_ms
+                )
+                db.add(thumbnail)
+                
+                record_timing(f"thumbnail.generation.time", proc_time_ms, tags=[f"size:{size_name}"])
+                record_histogram(f"thumbnail.size_bytes", file_size, tags=[f"size:{size_name}"])
             
-            record_timing(f"thumbnail.generation.time", proc_time_ms, tags=[f"size:{size_name}"])
-            record_histogram(f"thumbnail.size_bytes", file_size, tags=[f"size:{size_name}"])
-        
-        image.status = ImageStatus.COMPLETED
-        image.processed_at = datetime.utcnow()
-        db.commit()
+            image.status = ImageStatus.COMPLETED
+            image.processed_at = datetime.utcnow()
+            db.commit()
         
         total_time_ms = (time.time() - start_time) * 1000
         record_timing("worker.process.total_time", total_time_ms)
@@ -55,9 +88,18 @@ def process_image_message(message_data: dict, db):
         
         print(f"✅ Completed processing: {image_id}")
         return True
+    
+    except IntegrityError:
+        # A delivery whose claim had gone stale finished first
+        db.rollback()
+        print(f"ℹ️  Thumbnails already recorded by another delivery: {image_id}")
+        increment_counter("worker.process.count", tags=["status:skipped", "reason:duplicate"])
+        return True
         
     except Exception as e:
         print(f"❌ Error processing {image_id}: {e}")
+        # Drop any thumbnail rows added before the failure
+        db.rollback()
         image.status = ImageStatus.FAILED
         image.error_message = str(e)
         db.commit()
@@ -65,57 +107,168 @@ def process_image_message(message_data: dict, db):
         return False
 
 
-def main():
-    print("🚀 Starting Image Worker...")
+def handle_message(data: bytes) -> bool:
+    """Decode and process one message body; returns whether to ack it."""
+    try:
+        message_data = json.loads(data.decode("utf-8"))
+        print(f"📥 Received message: {message_data.get('image_id')}")
+        
+        db_gen = get_db()
+        db = next(db_gen)
+        try:
+            return process_image_message(message_data, db)
+        finally:
+            try:
+                next(db_gen)
+            except StopIteration:
+                pass
+    except Exception as e:
+        print(f"❌ Error handling message: {e}")
+        print(f"   Traceback: {traceback.format_exc()}")
+        return False
+
+
+def settle_message(ack_batcher: AckBatcher, ack_id: str, success: bool):
+    """Queue the ack of a processed message, or its nack for redelivery."""
+    if success:
+        ack_batcher.ack(ack_id)
+    else:
+        ack_batcher.nack(ack_id)
+
+
+def run_pull_loop(pubsub_client):
+    """
+    Pull messages in batches and process them on a thread pool, leasing them
+    with a LeaseManager and settling them through an AckBatcher.
+    """
+    lease_manager = LeaseManager(pubsub_client)
+    lease_manager.start()
+    ack_batcher = AckBatcher(pubsub_client)
+    ack_batcher.start()
     
-    init_db()
-    pubsub_client = get_pubsub_client()
+    # One slot per message being processed; the loop only pulls as many
+    # messages as there are free slots, so at most MAX_IN_FLIGHT are leased
+    slots = threading.BoundedSemaphore(Config.MAX_IN_FLIGHT)
+    in_flight = 0
+    in_flight_lock = threading.Lock()
+    executor = ThreadPoolExecutor(max_workers=Config.MAX_IN_FLIGHT, thread_name_prefix="message")
+    
+    def run_job(received_message):
+        nonlocal in_flight
+        success = False
+        try:
+            success = handle_message(received_message.message.data)
+        finally:
+            lease_manager.remove(received_message.ack_id)
+            settle_message(ack_batcher, received_message.ack_id, success)
+            with in_flight_lock:
+                in_flight -= 1
+                record_gauge("worker.in_flight", in_flight)
+            slots.release()
     
     print(f"👂 Listening for messages...")
+    print(f"   Batch size: {Config.BATCH_SIZE}, max in flight: {Config.MAX_IN_FLIGHT}")
     print(f"   Sleep interval: {Config.WORKER_SLEEP_SECONDS}s")
     
     while True:
         try:
-            messages = pubsub_client.pull_messages(max_messages=1, timeout=5.0)
+            slots.acquire()
+            free = 1
+            while free < Config.BATCH_SIZE and slots.acquire(blocking=False):
+                free += 1
+            
+            messages = []
+            try:
+                with timed("worker.stage.time", tags=["stage:pull"]):
+                    messages = pubsub_client.pull_messages(max_messages=free, timeout=5.0)
+            finally:
+                # Hand back the slots the pull did not fill
+                for _ in range(free - len(messages)):
+                    slots.release()
             
             if not messages:
                 time.sleep(Config.WORKER_SLEEP_SECONDS)
                 continue
             
+            with in_flight_lock:
+                in_flight += len(messages)
+                record_gauge("worker.in_flight", in_flight)
             for received_message in messages:
-                try:
-                    message_data = json.loads(received_message.message.data.decode("utf-8"))
-                    print(f"📥 Received message: {message_data.get('image_id')}")
-                    
-                    db_gen = get_db()
-                    db = next(db_gen)
-                    try:
-                        success = process_image_message(message_data, db)
-                    finally:
-                        try:
-                            next(db_gen)
-                        except StopIteration:
-                            pass
-                    
-                    if success:
-                        pubsub_client.acknowledge_message(received_message.ack_id)
-                    else:
-                        pubsub_client.nack_message(received_message.ack_id)
-                        
-                except Exception as e:
-                    import traceback
-                    print(f"❌ Error handling message: {e}")
-                    print(f"   Traceback: {traceback.format_exc()}")
-                    pubsub_client.nack_message(received_message.ack_id)
+                lease_manager.add(received_message.ack_id)
+                executor.submit(run_job, received_message)
         
         except KeyboardInterrupt:
             print("\n👋 Shutting down worker...")
             break
         except Exception as e:
             print(f"❌ Worker error: {e}")
+            increment_counter("worker.pull.errors")
+            time.sleep(5)
+    
+    # Let in-flight messages finish and settle before exiting
+    executor.shutdown(wait=True)
+    ack_batcher.close()
+    lease_manager.close()
+
+
+def run_streaming(pubsub_client):
+    """
+    Receive messages over a streaming pull. The client library enforces
+    MAX_IN_FLIGHT and FLOW_CONTROL_MAX_BYTES, extends leases and batches
+    acks, so no LeaseManager or AckBatcher is needed.
+    """
+    in_flight = 0
+    in_flight_lock = threading.Lock()
+    
+    def on_message(message):
+        nonlocal in_flight
+        with in_flight_lock:
+            in_flight += 1
+            record_gauge("worker.in_flight", in_flight)
+        success = False
+        try:
+            success = handle_message(message.data)
+        finally:
+            if success:
+                message.ack()
+            else:
+                message.nack()
+            with in_flight_lock:
+                in_flight -= 1
+                record_gauge("worker.in_flight", in_flight)
+    
+    print(f"👂 Listening for messages over a streaming pull...")
+    print(f"   Max in flight: {Config.MAX_IN_FLIGHT}, max outstanding bytes: {Config.FLOW_CONTROL_MAX_BYTES}")
+    
+    while True:
+        # The stream shuts its executor down when it ends, so each gets a new one
+        executor = ThreadPoolExecutor(max_workers=Config.MAX_IN_FLIGHT, thread_name_prefix="message")
+        streaming_pull = pubsub_client.subscribe(on_message, executor)
+        try:
+            streaming_pull.result()
+        except KeyboardInterrupt:
+            print("\n👋 Shutting down worker...")
+            # Waits for running callbacks to finish and settle
+            streaming_pull.cancel()
+            streaming_pull.result()
+            break
+        except Exception as e:
+            print(f"❌ Streaming pull stopped: {e}")
+            increment_counter("worker.pull.errors")
             time.sleep(5)
 
 
+def main():
+    print("🚀 Starting Image Worker...")
+    
+    init_db()
+    pubsub_client = get_pubsub_client()
+    
+    if Config.SUBSCRIBER_MODE == "streaming":
+        run_streaming(pubsub_client)
+    else:
+        run_pull_loop(pubsub_client)
+
+
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,94 @@
+"""
+Command line for the load tester.
+
+    python -m loadtest list
+    python -m loadtest run shortener-redirects --concurrency 50 --duration 30 --output before.json
+    python -m loadtest compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from loadtest.report import build_result, format_comparison, format_result
+from loadtest.runner import run
+from loadtest.scenarios import SCENARIOS
+
+
+def list_scenarios(args):
+    for name, cls in SCENARIOS.items():
+        print(f"{name:<24} {cls.default_url:<24} {cls.description}")
+
+
+def run_scenario(args):
+    scenario = SCENARIOS[args.scenario](args)
+    base_url = args.url or scenario.default_url
+    config = {
+        'concurrency': args.concurrency,
+        'duration_s': args.duration,
+        'warmup_s': args.warmup,
+        'rate': args.rate,
+        'seed': args.seed,
+        'keys': args.keys,
+        'zipf_s': args.zipf_s,
+        'write_ratio': args.write_ratio,
+        'batch_size': args.batch_size,
+        'burst_interval_s': args.burst_interval,
+    }
+    try:
+        recorder, elapsed = asyncio.run(run(scenario, base_url, args.concurrency, args.duration, warmup=args.warmup,
+                                            rate=args.rate, timeout=args.timeout, seed=args.seed))
+    except (ValueError, RuntimeError) as e:
+        sys.exit(f"error: {e}")
+
+    result = build_result(scenario, base_url, config, recorder, elapsed)
+    print(format_result(result))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+def compare_results(args):
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(format_comparison(old, new))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m loadtest', description='Load tests for the services in this repo')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('list', help='list scenarios').set_defaults(handler=list_scenarios)
+
+    run_parser = commands.add_parser('run', help='run a scenario')
+    run_parser.add_argument('scenario', choices=sorted(SCENARIOS))
+    run_parser.add_argument('--url', help="target base URL (default: the scenario's service)")
+    run_parser.add_argument('--concurrency', type=int, default=50, help='concurrent workers (default: 50)')
+    run_parser.add_argument('--duration', type=float, default=30, help='measured seconds (default: 30)')
+    run_parser.add_argument('--warmup', type=float, default=5, help='unrecorded seconds first (default: 5)')
+    run_parser.add_argument('--rate', type=float, help='open loop: total requests per second across workers')
+    run_parser.add_argument('--timeout', type=float, default=30, help='per-request timeout in seconds')
+    run_parser.add_argument('--seed', type=int, help='random seed, for repeatable request mixes')
+    run_parser.add_argument('--output', help='write the JSON result here')
+    run_parser.add_argument('--keys', type=int, default=1000, help='shortener: distinct short codes')
+    run_parser.add_argument('--zipf-s', type=float, default=1.1, help='shortener: Zipf exponent')
+    run_parser.add_argument('--write-ratio', type=float, default=0.1, help='mixed: share of write requests')
+    run_parser.add_argument('--batch-size', type=int, default=100, help='sandbox-mixed: points per ingest')
+    run_parser.add_argument('--burst-interval', type=float, default=5, help='upload-burst: seconds between bursts')
+    run_parser.add_argument('--image', help='upload-burst: image to upload instead of a generated one')
+    run_parser.set_defaults(handler=run_scenario)
+
+    compare_parser = commands.add_parser('compare', help='compare two JSON results')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.set_defaults(handler=compare_results)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
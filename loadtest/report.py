@@ -0,0 +1,104 @@
+"""
+JSON results and run-to-run comparison.
+
+A result holds the run configuration, the git commit it ran against, and
+for each operation its throughput, status codes, latency percentiles and the
+encoded HDR histogram. The percentiles can be read at a glance; the
+histogram (``HdrHistogram.decode()``) gives back every other percentile.
+"""
+import subprocess
+from datetime import datetime, timezone
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile_key(pct):
+    return 'p' + f'{pct:g}'.replace('.', '')
+
+
+def latency_summary(histogram):
+    summary = {'min': histogram.get_min_value() / 1000, 'mean': round(histogram.get_mean_value() / 1000, 3)}
+    for pct in PERCENTILES:
+        summary[percentile_key(pct)] = histogram.get_value_at_percentile(pct) / 1000
+    summary['max'] = histogram.get_max_value() / 1000
+    return summary
+
+
+def build_result(scenario, base_url, config, recorder, elapsed):
+    operations = {}
+    for name, stats in sorted(recorder.operations.items()):
+        count = stats.histogram.get_total_count()
+        operations[name] = {
+            'count': count,
+            'errors': stats.errors,
+            'throughput_rps': round(count / elapsed, 2),
+            'status_codes': dict(sorted(stats.statuses.items())),
+            'latency_ms': latency_summary(stats.histogram),
+            'hdr_histogram': stats.histogram.encode().decode('ascii'),
+        }
+    total = sum(op['count'] for op in operations.values())
+    return {
+        'scenario': scenario.name,
+        'target': base_url,
+        'git_commit': git_commit(),
+        'finished_at': datetime.now(timezone.utc).isoformat(),
+        'config': config,
+        'duration_s': round(elapsed, 3),
+        'requests': total,
+        'errors': sum(op['errors'] for op in operations.values()),
+        'throughput_rps': round(total / elapsed, 2),
+        'operations': operations,
+    }
+
+
+def format_result(result):
+    lines = [
+        f"{result['scenario']} against {result['target']} (commit {result['git_commit'] or 'unknown'})",
+        f"{result['requests']} requests in {result['duration_s']:.1f}s, {result['throughput_rps']:.1f} req/s, "
+        f"{result['errors']} errors",
+        '',
+        f"{'operation':<12} {'count':>8} {'req/s':>9} {'errors':>7} "
+        + ' '.join(f"{percentile_key(pct) + ' ms':>9}" for pct in PERCENTILES) + f" {'max ms':>9}",
+    ]
+    for name, op in result['operations'].items():
+        latency = op['latency_ms']
+        lines.append(
+            f"{name:<12} {op['count']:>8} {op['throughput_rps']:>9.1f} {op['errors']:>7} "
+            + ' '.join(f"{latency[percentile_key(pct)]:>9.2f}" for pct in PERCENTILES)
+            + f" {latency['max']:>9.2f}"
+        )
+    return '\n'.join(lines)
+
+
+def _change(old, new):
+    if not old:
+        return '    n/a'
+    return f'{(new - old) / old * 100:+6.1f}%'
+
+
+def format_comparison(old, new):
+    """Throughput and latency percentiles of ``new`` relative to ``old``, per operation."""
+    lines = [
+        f"{old['scenario']}: {old['git_commit'] or 'unknown'} -> {new['git_commit'] or 'unknown'}",
+        f"{'operation':<12} {'metric':<8} {'old':>10} {'new':>10} {'change':>8}",
+    ]
+    for name in sorted(set(old['operations']) | set(new['operations'])):
+        old_op, new_op = old['operations'].get(name), new['operations'].get(name)
+        if old_op is None or new_op is None:
+            lines.append(f"{name:<12} only in {'new' if old_op is None else 'old'} run")
+            continue
+        rows = [('req/s', old_op['throughput_rps'], new_op['throughput_rps'])]
+        rows += [(key, old_op['latency_ms'][key], new_op['latency_ms'][key])
+                 for key in [percentile_key(pct) for pct in PERCENTILES] + ['max']]
+        rows.append(('errors', old_op['errors'], new_op['errors']))
+        for metric, old_value, new_value in rows:
+            lines.append(f"{name:<12} {metric:<8} {old_value:>10.2f} {new_value:>10.2f} {_change(old_value, new_value):>8}")
+    return '\n'.join(lines)
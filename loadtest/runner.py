@@ -0,0 +1,134 @@
+"""
+Closed- and open-loop load runner.
+
+``run()`` starts ``concurrency`` workers that call a scenario's ``step()``
+over and over. Without a rate, each worker sends its next request as soon
+as the previous one returns (closed loop). With ``rate`` set, requests are
+scheduled at fixed intervals and latency is measured from the scheduled
+time rather than the send time. That way a server that stalls is charged
+for the requests that queued up behind the stall, instead of the stall
+hiding them (coordinated omission).
+
+Latencies go into one HDR histogram per operation, in microseconds.
+"""
+import asyncio
+import itertools
+import random
+import time
+from collections import Counter
+
+import httpx
+from hdrh.histogram import HdrHistogram
+
+LOWEST_LATENCY_US = 1
+HIGHEST_LATENCY_US = 120 * 1000 * 1000
+SIGNIFICANT_FIGURES = 3
+# httpx scans its connection pool on every request, so one client with
+# hundreds of connections burns more CPU here than the server spends;
+# workers share clients in groups of this size instead
+CLIENT_POOL_SIZE = 25
+
+
+class OperationStats:
+    """Latency histogram, status codes and error count for one operation."""
+
+    def __init__(self):
+        self.histogram = HdrHistogram(LOWEST_LATENCY_US, HIGHEST_LATENCY_US, SIGNIFICANT_FIGURES)
+        self.statuses = Counter()
+        self.errors = 0
+
+    def record(self, latency_us, status, ok):
+        self.histogram.record_value(min(max(int(latency_us), LOWEST_LATENCY_US), HIGHEST_LATENCY_US))
+        self.statuses[str(status)] += 1
+        if not ok:
+            self.errors += 1
+
+
+class Recorder:
+    """Per-operation stats for requests that started inside the measured window."""
+
+    def __init__(self, measure_from):
+        self.measure_from = measure_from
+        self.operations = {}
+
+    def record(self, operation, started_at, latency_us, status, ok):
+        if started_at < self.measure_from:
+            return
+        stats = self.operations.get(operation)
+        if stats is None:
+            stats = self.operations[operation] = OperationStats()
+        stats.record(latency_us, status, ok)
+
+
+class Session:
+    """
+    What a scenario step talks to the target through: a pooled client, the
+    recorder and a per-worker random generator.
+    """
+
+    def __init__(self, client, recorder, rng, stop_at):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.stop_at = stop_at
+        self.scheduled_at = None
+
+    async def request(self, operation, method, path, expect=(200,), **kwargs):
+        """Send one request and record it under ``operation``; returns the response or None."""
+        started_at = self.scheduled_at if self.scheduled_at is not None else time.perf_counter()
+        self.scheduled_at = None
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            status, ok = response.status_code, response.status_code in expect
+        except httpx.HTTPError as e:
+            response, status, ok = None, type(e).__name__, False
+        self.recorder.record(operation, started_at, (time.perf_counter() - started_at) * 1e6, status, ok)
+        return response
+
+
+def new_client(base_url, timeout, connections):
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    return httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits)
+
+
+async def run(scenario, base_url, concurrency, duration, warmup=0.0, rate=None, timeout=30.0, seed=None):
+    """
+    Drive ``scenario`` against ``base_url`` and return the recorder and the
+    length of the measured window in seconds. Requests sent during the first
+    ``warmup`` seconds are not recorded.
+    """
+    if rate is not None and scenario.self_paced:
+        raise ValueError(f"{scenario.name} sets its own arrival pattern and does not take a rate")
+
+    rng = random.Random(seed)
+    group_sizes = [min(CLIENT_POOL_SIZE, concurrency - i) for i in range(0, concurrency, CLIENT_POOL_SIZE)]
+    clients = [new_client(base_url, timeout, size) for size in group_sizes]
+    try:
+        await scenario.setup(clients[0], rng)
+
+        started = time.perf_counter()
+        recorder = Recorder(started + warmup)
+        stop_at = recorder.measure_from + duration
+        tickets = itertools.count()
+
+        async def worker(index):
+            session = Session(clients[index // CLIENT_POOL_SIZE], recorder, random.Random(rng.random()), stop_at)
+            while True:
+                if rate is not None:
+                    scheduled_at = started + next(tickets) / rate
+                    if scheduled_at >= stop_at:
+                        return
+                    delay = scheduled_at - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    session.scheduled_at = scheduled_at
+                elif time.perf_counter() >= stop_at:
+                    return
+                await scenario.step(session)
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - recorder.measure_from
+    finally:
+        for client in clients:
+            await client.aclose()
+    return recorder, elapsed
@@ -0,0 +1,147 @@
+"""
+Scripted workloads for the services in this repo.
+
+A scenario seeds whatever data it needs in ``setup()``. It then implements
+``step()``, which sends one request through ``session.request()``.
+``SCENARIOS`` maps the command-line names to the classes.
+"""
+import asyncio
+import io
+import itertools
+import math
+import time
+import uuid
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+SCENARIOS = {}
+
+
+def scenario(cls):
+    SCENARIOS[cls.name] = cls
+    return cls
+
+
+class Scenario:
+    name = ''
+    description = ''
+    default_url = ''
+    # Scenarios that time their own requests (bursts) cannot take --rate
+    self_paced = False
+
+    def __init__(self, options):
+        self.options = options
+
+    async def setup(self, client, rng):
+        pass
+
+    async def step(self, session):
+        raise NotImplementedError
+
+
+def zipf_cum_weights(n, s):
+    """Cumulative weights for ranks 1..n with P(k) proportional to 1/k**s."""
+    return list(itertools.accumulate(1 / k ** s for k in range(1, n + 1)))
+
+
+class ShortenerScenario(Scenario):
+    default_url = 'http://localhost:8080'
+
+    async def setup(self, client, rng):
+        # Shortening is idempotent, so re-running reuses the same codes
+        self.codes = []
+        for start in range(0, self.options.keys, 50):
+            responses = await asyncio.gather(*(
+                client.post('/shorten', json={'url': f'https://example.com/loadtest/{i}'})
+                for i in range(start, min(start + 50, self.options.keys))
+            ))
+            for response in responses:
+                response.raise_for_status()
+                self.codes.append(response.json()['short_code'])
+        self.cum_weights = zipf_cum_weights(len(self.codes), self.options.zipf_s)
+
+    async def redirect(self, session):
+        code = session.rng.choices(self.codes, cum_weights=self.cum_weights)[0]
+        await session.request('redirect', 'GET', f'/{code}', expect=(302,))
+
+
+@scenario
+class ShortenerRedirects(ShortenerScenario):
+    name = 'shortener-redirects'
+    description = 'url-shortener: redirects over --keys codes with Zipf(--zipf-s) popularity'
+
+    async def step(self, session):
+        await self.redirect(session)
+
+
+@scenario
+class ShortenerMixed(ShortenerScenario):
+    name = 'shortener-mixed'
+    description = 'url-shortener: Zipf redirects, with --write-ratio of requests shortening new URLs'
+
+    async def step(self, session):
+        if session.rng.random() < self.options.write_ratio:
+            await session.request('shorten', 'POST', '/shorten',
+                                  json={'url': f'https://example.com/loadtest/new/{uuid.uuid4().hex}'})
+        else:
+            await self.redirect(session)
+
+
+@scenario
+class SandboxMixed(Scenario):
+    name = 'sandbox-mixed'
+    description = ('sandbox flask-app: --write-ratio metric batches of --batch-size points, '
+                   'the rest split 80/20 between range queries and health checks')
+    default_url = 'http://localhost:5001'
+    metric_names = [f'loadtest.metric.{i}' for i in range(10)]
+
+    async def step(self, session):
+        if session.rng.random() < self.options.write_ratio:
+            now = time.time()
+            points = [{'name': session.rng.choice(self.metric_names), 'value': session.rng.random() * 100,
+                       'timestamp': now} for _ in range(self.options.batch_size)]
+            await session.request('ingest', 'POST', '/api/metrics', expect=(202,), json=points)
+        elif session.rng.random() < 0.8:
+            await session.request('query', 'GET', '/api/metrics/query',
+                                  params={'name': session.rng.choice(self.metric_names), 'step': 60})
+        else:
+            await session.request('health', 'GET', '/api/health')
+
+
+@scenario
+class ThumbnailUploadBurst(Scenario):
+    name = 'thumbnail-upload-burst'
+    description = ('thumbnail API: every --burst-interval seconds all workers upload an image at once '
+                   '(--image, or a generated JPEG)')
+    default_url = 'http://localhost:8000'
+    self_paced = True
+
+    async def setup(self, client, rng):
+        if self.options.image:
+            with open(self.options.image, 'rb') as f:
+                self.image = f.read()
+        elif Image is not None:
+            buffer = io.BytesIO()
+            Image.effect_noise((1600, 1200), 64).convert('RGB').save(buffer, 'JPEG', quality=85)
+            self.image = buffer.getvalue()
+        else:
+            raise RuntimeError("pass --image or install Pillow to generate a test image")
+        self.origin = None
+
+    async def step(self, session):
+        now = time.perf_counter()
+        if self.origin is None:
+            self.origin = now
+        interval = self.options.burst_interval
+        burst_at = self.origin + math.ceil((now - self.origin) / interval) * interval
+        await asyncio.sleep(max(0.0, min(burst_at, session.stop_at) - now))
+        if burst_at >= session.stop_at:
+            return
+        # Bytes after the JPEG end marker are ignored by decoders but make
+        # every upload distinct, so none can be served from an earlier one
+        content = self.image + uuid.uuid4().bytes
+        await session.request('upload', 'POST', '/api/images', expect=(201,),
+                              files={'file': ('loadtest.jpg', content, 'image/jpeg')})
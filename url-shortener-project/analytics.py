@@ -0,0 +1,207 @@
+"""
+Asynchronous click analytics for redirects.
+
+``redirect_url()`` only calls ``ClickTracker.record()``, which appends a tuple
+to a bounded ring buffer and returns; it never takes a lock or touches disk.
+A background aggregator drains the buffer every second into per-code totals,
+referrer counts and per-minute buckets, and every ``flush_interval`` seconds
+appends the changed aggregates to ``data/clicks.log``. The log is replayed
+and compacted on startup.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import urlparse
+
+from datadog import statsd
+
+logger = logging.getLogger(__name__)
+
+CLICK_BUFFER_SIZE = int(os.getenv('CLICK_BUFFER_SIZE', '100000'))
+CLICK_FLUSH_INTERVAL_SECONDS = float(os.getenv('CLICK_FLUSH_INTERVAL_SECONDS', '60'))
+# Per-minute buckets older than this are dropped; totals are kept forever
+CLICK_RETENTION_MINUTES = int(os.getenv('CLICK_RETENTION_MINUTES', '1440'))
+MAX_REFERRERS_PER_CODE = 50
+AGGREGATE_INTERVAL_SECONDS = 1.0
+
+
+class CodeStats:
+    """Click aggregates for one short code."""
+
+    __slots__ = ('total', 'referrers', 'minutes')
+
+    def __init__(self):
+        self.total = 0
+        self.referrers = Counter()
+        self.minutes = {}
+
+    def add(self, minute, clicks, referrers):
+        self.total += clicks
+        if minute is not None:
+            self.minutes[minute] = self.minutes.get(minute, 0) + clicks
+        for referrer, count in referrers.items():
+            if referrer not in self.referrers and len(self.referrers) >= MAX_REFERRERS_PER_CODE:
+                referrer = 'other'
+            self.referrers[referrer] += count
+
+    def prune(self, oldest_minute):
+        for minute in [m for m in self.minutes if m < oldest_minute]:
+            del self.minutes[minute]
+
+
+class ClickTracker:
+    """Ring buffer of click events plus the background aggregator."""
+
+    def __init__(self, log_file, buffer_size=CLICK_BUFFER_SIZE, flush_interval=CLICK_FLUSH_INTERVAL_SECONDS,
+                 retention_minutes=CLICK_RETENTION_MINUTES):
+        self.log_file = log_file
+        self.flush_interval = flush_interval
+        self.retention_minutes = retention_minutes
+        # deque.append with maxlen is atomic and overwrites the oldest event
+        # when full, so recording a click never blocks
+        self._events = deque(maxlen=buffer_size)
+        self._dropped = 0
+        self._stats = {}
+        # (code, minute) -> {referrer: count} changed since the last flush
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._load()
+
+    def record(self, short_code, referrer=None):
+        """Queue a click; called on the redirect hot path."""
+        events = self._events
+        if len(events) == events.maxlen:
+            self._dropped += 1
+        events.append((short_code, referrer, time.time()))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='click-aggregator', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        last_flush = time.time()
+        while not self._stop.wait(AGGREGATE_INTERVAL_SECONDS):
+            self._aggregate()
+            if time.time() - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = time.time()
+
+    def _aggregate(self):
+        events = self._events
+        batch = []
+        while events:
+            try:
+                batch.append(events.popleft())
+            except IndexError:
+                break
+        if self._dropped:
+            dropped, self._dropped = self._dropped, 0
+            statsd.increment('url_shortener.analytics.dropped', value=dropped)
+        if not batch:
+            return
+
+        counts = Counter()
+        for short_code, referrer, timestamp in batch:
+            counts[(short_code, int(timestamp // 60), _referrer_host(referrer))] += 1
+
+        with self._lock:
+            for (short_code, minute, referrer), count in counts.items():
+                stats = self._stats.get(short_code)
+                if stats is None:
+                    stats = self._stats[short_code] = CodeStats()
+                stats.add(minute, count, {referrer: count})
+                pending = self._pending.setdefault((short_code, minute), Counter())
+                pending[referrer] += count
+        statsd.histogram('url_shortener.analytics.batch_size', len(batch))
+
+    def flush(self):
+        """Append aggregates changed since the last flush to the click log."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            oldest_minute = int(time.time() // 60) - self.retention_minutes
+            for stats in self._stats.values():
+                stats.prune(oldest_minute)
+        if not pending:
+            return
+
+        start_time = time.time()
+        lines = [
+            json.dumps({'code': short_code, 'minute': minute, 'clicks': sum(referrers.values()),
+                        'referrers': referrers})
+            for (short_code, minute), referrers in pending.items()
+        ]
+        try:
+            os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+            with open(self.log_file, 'a') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            logger.error(f"Click flush failed: {e}")
+            return
+        statsd.histogram('url_shortener.analytics.flush_latency', (time.time() - start_time) * 1000)
+
+    def _load(self):
+        if not os.path.exists(self.log_file):
+            return
+        oldest_minute = int(time.time() // 60) - self.retention_minutes
+        with open(self.log_file, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping corrupt click record in {self.log_file}")
+                    continue
+                stats = self._stats.get(record['code'])
+                if stats is None:
+                    stats = self._stats[record['code']] = CodeStats()
+                stats.add(record['minute'], record['clicks'], record['referrers'])
+        for stats in self._stats.values():
+            stats.prune(oldest_minute)
+        self._compact_log()
+
+    def _compact_log(self):
+        # Rewrites the log as one record per retained minute, plus one
+        # record per code with its referrers and the clicks from minutes
+        # that have already expired
+        tmp_path = self.log_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for short_code, stats in self._stats.items():
+                for minute, clicks in stats.minutes.items():
+                    f.write(json.dumps({'code': short_code, 'minute': minute, 'clicks': clicks, 'referrers': {}}) + '\n')
+                f.write(json.dumps({'code': short_code, 'minute': None, 'clicks': stats.total - sum(stats.minutes.values()),
+                                    'referrers': stats.referrers}) + '\n')
+        os.replace(tmp_path, self.log_file)
+
+    def get_stats(self, short_code, minutes=60):
+        """Return aggregates for a code, or None if it was never clicked."""
+        now_minute = int(time.time() // 60)
+        with self._lock:
+            stats = self._stats.get(short_code)
+            if stats is None:
+                return None
+            buckets = [
+                {'minute': minute * 60, 'clicks': stats.minutes.get(minute, 0)}
+                for minute in range(now_minute - minutes + 1, now_minute + 1)
+            ]
+            return {
+                'total_clicks': stats.total,
+                'referrers': dict(stats.referrers.most_common(10)),
+                'clicks_per_minute': buckets,
+            }
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._aggregate()
+        self.flush()
+
+
+def _referrer_host(referrer):
+    if not referrer:
+        return 'direct'
+    return urlparse(referrer).netloc or 'direct'
@@ -1,5 +1,5 @@
-from flask import Flask, request, redirect, jsonify, render_template_string
-import hashlib
+from flask import Flask, Response, request, redirect, jsonify, render_template_string, stream_with_context
+import atexit
 import json
 import os
 import time
@@ -9,63 +9,101 @@ from datetime import datetime
 from datadog import initialize, statsd
 import logging
 
+from analytics import ClickTracker
+from cache import RedirectCache
+from codes import CodeAllocator, IdRangeAllocator
+from log_pipeline import setup_logging
+from metrics import MetricAggregator
+from storage import create_store
+
 # Initialize DataDog
 initialize()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Request metrics are aggregated in process and flushed to the agent every
+# METRICS_FLUSH_INTERVAL_SECONDS (see metrics.py) instead of one UDP packet
+# per metric per request
+request_metrics = MetricAggregator()
+
+# Configure logging: JSON lines written by a background thread, with
+# success-path logs sampled at LOG_SAMPLE_RATE (see log_pipeline.py)
+setup_logging(dropped_counter=request_metrics.counter('url_shortener.logs.dropped', ('level',)))
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Middleware metrics, declared once with their tag names
+requests_count = request_metrics.counter('url_shortener.requests.count', ('endpoint', 'method'))
+responses_count = request_metrics.counter('url_shortener.responses.count', ('endpoint', 'method', 'status'))
+response_time_ms = request_metrics.histogram('url_shortener.response_time', ('endpoint', 'method', 'status'))
+request_metrics.start()
+
 # Middleware for automatic request logging and metrics
 @app.before_request
 def before_request():
     request.start_time = time.time()
     
     # Track request count by endpoint and method
-    statsd.increment('url_shortener.requests.count', 
-                    tags=[f'endpoint:{request.endpoint}', f'method:{request.method}'])
+    requests_count.increment(request.endpoint, request.method)
 
 @app.after_request
 def after_request(response):
     # Calculate response time
     response_time = time.time() - request.start_time
-    response_time_ms = response_time * 1000  # Convert to milliseconds for DataDog
     
     # Log request
-    logger.info(f"{request.method} {request.path} - {response.status_code} - {response_time:.3f}s")
+    logger.info("%s %s - %s - %.3fs", request.method, request.path, response.status_code, response_time,
+                extra={'sampled': response.status_code < 400})
     
-    # Send metrics to DataDog (in milliseconds)
-    statsd.histogram('url_shortener.response_time', response_time_ms,
-                    tags=[f'endpoint:{request.endpoint}', f'method:{request.method}', f'status:{response.status_code}'])
-    
-    statsd.increment('url_shortener.responses.count',
-                    tags=[f'endpoint:{request.endpoint}', f'method:{request.method}', f'status:{response.status_code}'])
+    # Record metrics for the next flush (in milliseconds)
+    response_time_ms.record(response_time * 1000, request.endpoint, request.method, response.status_code)
+    responses_count.increment(request.endpoint, request.method, response.status_code)
     
     return response
 
-# Simple in-memory storage (will be lost on restart)
-url_store = {}
+# Pluggable storage engine (see storage.py); 'log' appends to a write-ahead
+# log instead of rewriting the whole JSON file on every new URL
 DATA_FILE = 'data/urls.json'
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'log')
 
-# Load existing URLs if file exists
-if os.path.exists(DATA_FILE):
-    try:
-        with open(DATA_FILE, 'r') as f:
-            url_store = json.load(f)
-    except:
-        url_store = {}
+url_store = create_store(STORAGE_BACKEND, DATA_FILE)
+atexit.register(url_store.close)
+
+# Counter-based code allocation (see codes.py); ids are leased in blocks from
+# the counter file, so codes never collide, even across restarts
+CODE_COUNTER_FILE = 'data/code_counter'
+CODE_BLOCK_SIZE = int(os.getenv('CODE_BLOCK_SIZE', '1000'))
+
+code_allocator = CodeAllocator(url_store, IdRangeAllocator(CODE_COUNTER_FILE, CODE_BLOCK_SIZE))
+
+# Hot-link cache in front of the store (see cache.py); off by default, since
+# every engine, mmap included, answers a lookup faster than the cache does
+REDIRECT_CACHE_SIZE = int(os.getenv('REDIRECT_CACHE_SIZE', '0'))
+REDIRECT_CACHE_TTL_SECONDS = float(os.getenv('REDIRECT_CACHE_TTL_SECONDS', '300'))
+
+redirect_cache = None
+if REDIRECT_CACHE_SIZE > 0:
+    redirect_cache = RedirectCache(REDIRECT_CACHE_SIZE, REDIRECT_CACHE_TTL_SECONDS)
+    redirect_cache.start_reporting()
 
-def save_urls():
-    """Save URLs to file for persistence"""
-    os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
-    with open(DATA_FILE, 'w') as f:
-        json.dump(url_store, f)
 
-def generate_short_code(url):
-    """Generate a short code from URL using hash"""
-    return hashlib.md5(url.encode()).hexdigest()[:6]
+def lookup_url(short_code):
+    """Resolve a short code through the redirect cache, if enabled"""
+    if redirect_cache is None:
+        return url_store.get(short_code)
+    url = redirect_cache.get(short_code)
+    if url is None:
+        url = url_store.get(short_code)
+        if url is not None:
+            redirect_cache.put(short_code, url)
+    return url
+
+# Click analytics (see analytics.py); redirects only push onto a ring buffer,
+# aggregation and the disk writes happen on a background thread
+CLICKS_FILE = 'data/clicks.log'
+
+click_tracker = ClickTracker(CLICKS_FILE)
+click_tracker.start()
+atexit.register(click_tracker.close)
 
 # Simple HTML template
 HTML_TEMPLATE = '''
@@ -126,16 +164,20 @@ def shorten_url():
         if not url.startswith(('http://', 'https://')):
             url = 'http://' + url
         
-        short_code = generate_short_code(url)
-        url_store[short_code] = url
-        save_urls()
+        short_code, created = code_allocator.shorten(url)
+        if redirect_cache is not None:
+            redirect_cache.invalidate(short_code)
         
         # Track business metrics
-        statsd.increment('url_shortener.urls.created', tags=[f'request_type:{request_type}'])
-        statsd.gauge('url_shortener.urls.total', len(url_store))
+        if created:
+            statsd.increment('url_shortener.urls.created', tags=[f'request_type:{request_type}'])
+            statsd.gauge('url_shortener.urls.total', len(url_store))
+        else:
+            statsd.increment('url_shortener.urls.deduplicated', tags=[f'request_type:{request_type}'])
         
         # Log successful creation
-        logger.info(f"URL shortened: {url} -> {short_code} (type: {request_type})")
+        logger.info("URL shortened: %s -> %s (type: %s, new: %s)", url, short_code, request_type, created,
+                    extra={'sampled': True})
         
         short_url = f"http://localhost:8080/{short_code}"
         
@@ -162,18 +204,21 @@ def shorten_url():
     except Exception as e:
         # Track application errors (business-specific metric)
         statsd.increment('url_shortener.errors', tags=['error_type:application'])
-        logger.error(f"Error shortening URL: {str(e)}")
+        logger.error("Error shortening URL: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/<short_code>')
 def redirect_url(short_code):
-    url = url_store.get(short_code)
+    url = lookup_url(short_code)
     if url:
         # Track successful redirect (business-specific metric)
         statsd.increment('url_shortener.urls.accessed', tags=['status:success'])
         
+        # Queue the click for the analytics aggregator
+        click_tracker.record(short_code, request.referrer)
+        
         # Log successful access
-        logger.info(f"URL accessed: {short_code} -> {url}")
+        logger.info("URL accessed: %s -> %s", short_code, url, extra={'sampled': True})
         
         return redirect(url)
     else:
@@ -182,33 +227,114 @@ def redirect_url(short_code):
         statsd.increment('url_shortener.errors', tags=['error_type:not_found'])
         
         # Log 404
-        logger.warning(f"URL not found: {short_code}")
+        logger.warning("URL not found: %s", short_code)
         
         return jsonify({'error': 'Short URL not found'}), 404
 
+# /stats returns one page of URLs by default; the full mapping is only built
+# when explicitly requested with ?full=true
+STATS_PAGE_SIZE = 100
+STATS_MAX_PAGE_SIZE = 1000
+
+def stream_urls(cursor):
+    """Yield every URL after cursor as NDJSON, one store page at a time"""
+    while True:
+        urls, cursor = url_store.scan(cursor, STATS_MAX_PAGE_SIZE)
+        for short_code, url in urls:
+            yield json.dumps({'short_code': short_code, 'url': url}) + '\n'
+        if cursor is None:
+            return
+
 @app.route('/stats')
 def stats():
     try:
+        # O(1) for every storage engine; maintained as URLs are added
         total_urls = len(url_store)
         
         # Update current total URLs gauge (business-specific metric)
         statsd.gauge('url_shortener.urls.total', total_urls)
         
         # Track stats access (business-specific metric)
-        statsd.increment('url_shortener.stats.accessed')
+        mode = 'page'
+        if request.args.get('format') == 'ndjson':
+            mode = 'ndjson'
+        elif request.args.get('full') == 'true':
+            mode = 'full'
+        statsd.increment('url_shortener.stats.accessed', tags=[f'mode:{mode}'])
         
         # Log stats access
-        logger.info(f"Stats accessed: {total_urls} total URLs")
+        logger.info("Stats accessed: %s total URLs (mode: %s)", total_urls, mode, extra={'sampled': True})
+        
+        cursor = request.args.get('cursor')
+        if mode == 'ndjson':
+            # Validate the cursor before the response starts streaming
+            url_store.scan(cursor, 1)
+            return Response(stream_with_context(stream_urls(cursor)), mimetype='application/x-ndjson')
+        
+        if mode == 'full':
+            return jsonify({
+                'total_urls': total_urls,
+                'urls': dict(url_store.items())
+            })
+        
+        limit = int(request.args.get('limit', STATS_PAGE_SIZE))
+        if not 1 <= limit <= STATS_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {STATS_MAX_PAGE_SIZE}")
+        urls, next_cursor = url_store.scan(cursor, limit)
         
         return jsonify({
             'total_urls': total_urls,
-            'urls': url_store
+            'urls': dict(urls),
+            'next_cursor': next_cursor
         })
         
+    except ValueError as e:
+        # Track validation errors (business-specific metric)
+        statsd.increment('url_shortener.errors', tags=['error_type:validation'])
+        logger.warning("Invalid stats request: %s", e)
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
     except Exception as e:
         # Track stats errors (business-specific metric)
         statsd.increment('url_shortener.errors', tags=['error_type:application'])
-        logger.error(f"Error accessing stats: {str(e)}")
+        logger.error("Error accessing stats: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+# Per-code click analytics, served from the in-memory aggregates
+STATS_MAX_MINUTES = 1440
+
+@app.route('/stats/<short_code>')
+def code_stats(short_code):
+    try:
+        url = lookup_url(short_code)
+        if not url:
+            statsd.increment('url_shortener.errors', tags=['error_type:not_found'])
+            logger.warning("Stats requested for unknown code: %s", short_code)
+            return jsonify({'error': 'Short URL not found'}), 404
+        
+        minutes = int(request.args.get('minutes', 60))
+        if not 1 <= minutes <= STATS_MAX_MINUTES:
+            raise ValueError(f"minutes must be between 1 and {STATS_MAX_MINUTES}")
+        
+        # Track per-code stats access (business-specific metric)
+        statsd.increment('url_shortener.stats.accessed', tags=['mode:code'])
+        
+        clicks = click_tracker.get_stats(short_code, minutes)
+        if clicks is None:
+            clicks = {'total_clicks': 0, 'referrers': {}, 'clicks_per_minute': []}
+        
+        return jsonify({
+            'short_code': short_code,
+            'url': url,
+            **clicks
+        })
+        
+    except ValueError as e:
+        statsd.increment('url_shortener.errors', tags=['error_type:validation'])
+        logger.warning("Invalid stats request: %s", e)
+        return jsonify({'error': 'Invalid minutes'}), 400
+    except Exception as e:
+        statsd.increment('url_shortener.errors', tags=['error_type:application'])
+        logger.error("Error accessing stats for %s: %s", short_code, e)
         return jsonify({'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
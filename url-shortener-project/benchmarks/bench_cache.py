@@ -0,0 +1,102 @@
+"""
+Redirect lookup latency under a Zipf workload, with and without the cache.
+
+Builds an mmap redirect table of --links URLs, then replays --requests
+lookups whose codes follow a Zipf distribution (exponent --zipf) through the
+same path as redirect_url(): RedirectCache first, table on a miss.
+
+A warm mmap table in the page cache is about as fast as the cache itself;
+--backend-latency-us adds a busy-wait to every table lookup to model a cold
+disk or an external store.
+
+    python benchmarks/bench_cache.py --links 1000000 --cache-size 10000
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cache import RedirectCache  # noqa: E402
+from codes import encode_code  # noqa: E402
+from mmap_table import MmapTable, write_table  # noqa: E402
+
+
+def zipf_codes(codes, exponent, count):
+    weights = [1 / (rank ** exponent) for rank in range(1, len(codes) + 1)]
+    cum_weights = list(itertools.accumulate(weights))
+    ranked = codes[:]
+    random.shuffle(ranked)
+    return random.choices(ranked, cum_weights=cum_weights, k=count)
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def slow_backend(table, latency_ns):
+    def get(code):
+        deadline = time.perf_counter_ns() + latency_ns
+        url = table.get(code)
+        while time.perf_counter_ns() < deadline:
+            pass
+        return url
+    return get
+
+
+def run(backend_get, workload, cache):
+    latencies = []
+    clock = time.perf_counter_ns
+    for code in workload:
+        start = clock()
+        if cache is None:
+            backend_get(code)
+        else:
+            url = cache.get(code)
+            if url is None:
+                url = backend_get(code)
+                if url is not None:
+                    cache.put(code, url)
+        latencies.append(clock() - start)
+    latencies.sort()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--links', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--cache-size', type=int, default=10000)
+    parser.add_argument('--backend-latency-us', type=float, default=0)
+    args = parser.parse_args()
+
+    codes = [encode_code(i + 1) for i in range(args.links)]
+    workload = zipf_codes(codes, args.zipf, args.requests)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        table_path = os.path.join(tmp_dir, 'urls.table')
+        write_table(table_path, ((code, f"https://www.example.com/{code}") for code in codes), len(codes))
+        table = MmapTable(table_path)
+        backend_get = table.get
+        if args.backend_latency_us:
+            backend_get = slow_backend(table, int(args.backend_latency_us * 1000))
+
+        print(f"{args.links} links, {args.requests} requests, zipf s={args.zipf}, "
+              f"cache size {args.cache_size}, backend latency {args.backend_latency_us}us")
+        print(f"{'cache':<8}{'p50 ns':>10}{'p99 ns':>10}{'p99.9 ns':>10}{'hit ratio':>11}")
+        for enabled in (False, True):
+            cache = RedirectCache(args.cache_size) if enabled else None
+            latencies = run(backend_get, workload, cache)
+            hit_ratio = f"{cache.hits / (cache.hits + cache.misses):.1%}" if cache else '-'
+            print(f"{'on' if enabled else 'off':<8}{percentile(latencies, 50):>10}"
+                  f"{percentile(latencies, 99):>10}{percentile(latencies, 99.9):>10}{hit_ratio:>11}")
+        table.close()
+
+
+if __name__ == '__main__':
+    main()
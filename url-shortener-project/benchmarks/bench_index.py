@@ -0,0 +1,80 @@
+"""
+Compare the plain dict URL store with CompactURLIndex.
+
+Reports memory per link (tracemalloc) and lookup throughput for both
+indexes over the same synthetic data set of fixed-width short codes.
+
+    python benchmarks/bench_index.py --links 1000000 --lookups 1000000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from codes import encode_code  # noqa: E402
+from compact_index import CompactURLIndex  # noqa: E402
+
+
+def make_links(count):
+    links = []
+    for i in range(count):
+        url = f"https://www.example.com/articles/{i}/some-readable-slug?ref=newsletter"
+        links.append((encode_code(i + 1), url))
+    return links
+
+
+def build(kind, links):
+    # Copy the strings so both indexes pay for their own objects
+    items = ((code.encode().decode(), url.encode().decode()) for code, url in links)
+    if kind == 'dict':
+        return dict(items)
+    index = CompactURLIndex()
+    for code, url in items:
+        index[code] = url
+    return index
+
+
+def measure_memory(kind, links):
+    gc.collect()
+    tracemalloc.start()
+    index = build(kind, links)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return index, current
+
+
+def measure_lookups(index, codes):
+    get = index.get
+    start = time.perf_counter()
+    for code in codes:
+        get(code)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--links', type=int, default=200000)
+    parser.add_argument('--lookups', type=int, default=500000)
+    args = parser.parse_args()
+
+    links = make_links(args.links)
+    unique = len(dict(links))
+    codes = [random.choice(links)[0] for _ in range(args.lookups)]
+
+    print(f"{unique} links, {args.lookups} lookups")
+    print(f"{'index':<10}{'memory MB':>12}{'bytes/link':>12}{'ns/lookup':>12}{'lookups/s':>14}")
+    for kind in ('dict', 'compact'):
+        index, memory = measure_memory(kind, links)
+        elapsed = measure_lookups(index, codes)
+        print(f"{kind:<10}{memory / 1024 / 1024:>12.1f}{memory / unique:>12.0f}"
+              f"{elapsed / args.lookups * 1e9:>12.0f}{args.lookups / elapsed:>14,.0f}")
+        del index
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Per-request cost of the metrics middleware, direct statsd vs aggregated.
+
+Replays --requests requests spread over a handful of endpoint/method/status
+combinations through the metric calls made by before_request() and
+after_request():
+
+- direct: the original three statsd calls with f-string tag lists, each
+  sending one UDP packet
+- aggregated: the MetricAggregator counters and histogram, plus the cost of
+  one flush at the end amortized over all requests
+
+Packets go to a local UDP socket that nobody reads, so the numbers only
+include the client side.
+
+    python benchmarks/bench_middleware.py --requests 200000
+"""
+import argparse
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from datadog.dogstatsd import DogStatsd  # noqa: E402
+from metrics import MetricAggregator  # noqa: E402
+
+ROUTES = [
+    ('redirect_url', 'GET', 302),
+    ('redirect_url', 'GET', 404),
+    ('shorten', 'POST', 200),
+    ('stats', 'GET', 200),
+    ('home', 'GET', 200),
+]
+
+
+def run_direct(client, requests):
+    start = time.perf_counter()
+    for endpoint, method, status, response_time in requests:
+        client.increment('url_shortener.requests.count',
+                         tags=[f'endpoint:{endpoint}', f'method:{method}'])
+        client.histogram('url_shortener.response_time', response_time * 1000,
+                         tags=[f'endpoint:{endpoint}', f'method:{method}', f'status:{status}'])
+        client.increment('url_shortener.responses.count',
+                         tags=[f'endpoint:{endpoint}', f'method:{method}', f'status:{status}'])
+    return time.perf_counter() - start, None
+
+
+def run_aggregated(client, requests):
+    aggregator = MetricAggregator(client=client)
+    requests_count = aggregator.counter('url_shortener.requests.count', ('endpoint', 'method'))
+    responses_count = aggregator.counter('url_shortener.responses.count', ('endpoint', 'method', 'status'))
+    response_time_ms = aggregator.histogram('url_shortener.response_time', ('endpoint', 'method', 'status'))
+
+    start = time.perf_counter()
+    for endpoint, method, status, response_time in requests:
+        requests_count.increment(endpoint, method)
+        response_time_ms.record(response_time * 1000, endpoint, method, status)
+        responses_count.increment(endpoint, method, status)
+    lines = aggregator.flush()
+    return time.perf_counter() - start, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200000)
+    args = parser.parse_args()
+
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('127.0.0.1', 0))
+    client = DogStatsd(host='127.0.0.1', port=sink.getsockname()[1])
+
+    requests = [(*random.choice(ROUTES), random.lognormvariate(-4, 1)) for _ in range(args.requests)]
+
+    print(f"{'mode':<12}{'total':>10}{'per request':>14}{'statsd lines':>14}")
+    for mode, run in (('direct', run_direct), ('aggregated', run_aggregated)):
+        elapsed, lines = run(client, requests)
+        if lines is None:
+            lines = 3 * len(requests)
+        print(f"{mode:<12}{elapsed:>9.2f}s{elapsed / len(requests) * 1e6:>12.2f}µs{lines:>14}")
+    sink.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare cold-start cost of the JSON snapshot with the mmap redirect table.
+
+Builds a synthetic store of --links URLs in a temporary directory, then times
+loading it with json.load versus opening it with MmapTable, plus a batch of
+lookups against each.
+
+    python benchmarks/bench_startup.py --links 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mmap_table import MmapTable, convert_json  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--links', type=int, default=200000)
+    parser.add_argument('--lookups', type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = os.path.join(tmp_dir, 'urls.json')
+        table_path = os.path.join(tmp_dir, 'urls.table')
+        urls = {format(i, '06x'): f"https://www.example.com/articles/{i}" for i in range(args.links)}
+        with open(json_path, 'w') as f:
+            json.dump(urls, f)
+        codes = random.choices(list(urls), k=args.lookups)
+        del urls
+
+        start = time.perf_counter()
+        convert_json(json_path, table_path)
+        print(f"convert: {time.perf_counter() - start:.3f}s for {args.links} links")
+
+        start = time.perf_counter()
+        with open(json_path) as f:
+            store = json.load(f)
+        json_start = time.perf_counter() - start
+
+        start = time.perf_counter()
+        table = MmapTable(table_path)
+        table_start = time.perf_counter() - start
+
+        print(f"{'format':<8}{'startup ms':>12}{'ns/lookup':>12}")
+        for name, startup, index in (('json', json_start, store), ('mmap', table_start, table)):
+            get = index.get
+            start = time.perf_counter()
+            for code in codes:
+                get(code)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<8}{startup * 1000:>12.2f}{elapsed / len(codes) * 1e9:>12.0f}")
+        table.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+In-process cache for hot redirects.
+
+Redirect traffic is heavily skewed, so a small cache in front of a disk-backed
+store (e.g. STORAGE_BACKEND=mmap) absorbs most lookups. ``RedirectCache`` is a
+W-TinyLFU cache:
+
+- new entries land in a small LRU window
+- entries evicted from the window only enter the main segmented LRU if a
+  count-min sketch says they are requested more often than the entry they
+  would push out, so one-hit wonders cannot flush popular links
+- the main area is split into probation and protected segments; a second hit
+  promotes an entry to protected
+
+Entries expire after a TTL and can be invalidated when a code is re-shortened.
+Hit/miss/eviction counts are kept locally and sent to statsd by ``report()``.
+"""
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from datadog import statsd
+
+WINDOW_RATIO = 0.01
+PROTECTED_RATIO = 0.8
+SKETCH_DEPTH = 4
+SKETCH_MAX_COUNT = 15
+_SKETCH_SEEDS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+
+
+class FrequencySketch:
+    """Count-min sketch of recent access frequency, halved periodically."""
+
+    def __init__(self, capacity):
+        width = 16
+        while width < capacity * 4:
+            width *= 2
+        self._mask = width - 1
+        self._rows = [array('B', bytes(width)) for _ in range(SKETCH_DEPTH)]
+        self._additions = 0
+        self._reset_after = max(capacity, 1) * 10
+
+    def _indexes(self, key):
+        h = hash(key)
+        return [((h * seed) >> 16) & self._mask for seed in _SKETCH_SEEDS]
+
+    def increment(self, key):
+        h = hash(key)
+        mask = self._mask
+        for row, seed in zip(self._rows, _SKETCH_SEEDS):
+            index = ((h * seed) >> 16) & mask
+            if row[index] < SKETCH_MAX_COUNT:
+                row[index] += 1
+        self._additions += 1
+        if self._additions >= self._reset_after:
+            self._age()
+
+    def frequency(self, key):
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    def _age(self):
+        # Halving keeps the sketch biased towards recent traffic
+        for i, row in enumerate(self._rows):
+            self._rows[i] = array('B', (count >> 1 for count in row))
+        self._additions //= 2
+
+
+class RedirectCache:
+    """Size-bounded W-TinyLFU cache of short code -> URL with a TTL."""
+
+    def __init__(self, capacity, ttl_seconds=300.0):
+        self.capacity = capacity
+        self.ttl = ttl_seconds
+        window_capacity = max(1, int(capacity * WINDOW_RATIO))
+        main_capacity = max(1, capacity - window_capacity)
+        self._window_capacity = window_capacity
+        self._protected_capacity = max(1, int(main_capacity * PROTECTED_RATIO))
+        self._probation_capacity = max(1, main_capacity - self._protected_capacity)
+
+        self._window = OrderedDict()
+        self._probation = OrderedDict()
+        self._protected = OrderedDict()
+        self._sketch = FrequencySketch(capacity)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._reported = (0, 0, 0)
+
+    def get(self, short_code):
+        with self._lock:
+            self._sketch.increment(short_code)
+            for segment in (self._protected, self._window, self._probation):
+                entry = segment.get(short_code)
+                if entry is None:
+                    continue
+                url, expires_at = entry
+                if expires_at <= time.monotonic():
+                    del segment[short_code]
+                    break
+                if segment is self._probation:
+                    del segment[short_code]
+                    self._promote(short_code, entry)
+                else:
+                    segment.move_to_end(short_code)
+                self.hits += 1
+                return url
+            self.misses += 1
+            return None
+
+    def _promote(self, short_code, entry):
+        self._protected[short_code] = entry
+        if len(self._protected) > self._protected_capacity:
+            demoted, demoted_entry = self._protected.popitem(last=False)
+            self._probation[demoted] = demoted_entry
+
+    def put(self, short_code, url):
+        entry = (url, time.monotonic() + self.ttl)
+        with self._lock:
+            self._remove(short_code)
+            self._window[short_code] = entry
+            if len(self._window) <= self._window_capacity:
+                return
+            candidate, candidate_entry = self._window.popitem(last=False)
+            if len(self._probation) + len(self._protected) < self._probation_capacity + self._protected_capacity:
+                self._probation[candidate] = candidate_entry
+                return
+            victim = next(iter(self._probation), None)
+            if victim is None:
+                self._protected.popitem(last=False)
+                self._probation[candidate] = candidate_entry
+            elif self._sketch.frequency(candidate) > self._sketch.frequency(victim):
+                del self._probation[victim]
+                self._probation[candidate] = candidate_entry
+            # Otherwise the candidate itself is rejected; either way one
+            # entry left the cache
+            self.evictions += 1
+
+    def invalidate(self, short_code):
+        with self._lock:
+            self._remove(short_code)
+
+    def _remove(self, short_code):
+        for segment in (self._window, self._probation, self._protected):
+            segment.pop(short_code, None)
+
+    def __len__(self):
+        return len(self._window) + len(self._probation) + len(self._protected)
+
+    def report(self):
+        """Send hit/miss/eviction counts since the last report to statsd."""
+        current = (self.hits, self.misses, self.evictions)
+        names = ('hits', 'misses', 'evictions')
+        for name, value, previous in zip(names, current, self._reported):
+            if value > previous:
+                statsd.increment(f'url_shortener.cache.{name}', value=value - previous)
+        self._reported = current
+        statsd.gauge('url_shortener.cache.size', len(self))
+
+    def start_reporting(self, interval_seconds=10.0):
+        def loop():
+            while True:
+                time.sleep(interval_seconds)
+                self.report()
+
+        threading.Thread(target=loop, name='redirect-cache-reporter', daemon=True).start()
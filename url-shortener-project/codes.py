@@ -0,0 +1,133 @@
+"""
+Short code allocation.
+
+Codes are minted from a counter instead of a truncated hash, so two URLs can
+never be given the same code:
+
+- ``IdRangeAllocator`` leases blocks of ids from a counter file, so ids are
+  never reused across restarts. The file is only read and written once per
+  block; within a block ids are handed out without any locking.
+- ``encode_code()`` turns an id into a fixed-width base62 code, scrambled by a
+  bijective multiply so consecutive ids don't produce guessable codes.
+- ``CodeAllocator`` ties both to a storage engine and keeps a reverse index
+  so shortening the same URL twice returns the same code.
+
+The app must run as a single process. The lease is safe across processes,
+but the storage engines keep their index in process memory and compaction
+renames log files that another process could still be appending to.
+"""
+import fcntl
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+BASE62_ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+CODE_LENGTH = 6
+# Any multiplier coprime with 62 permutes [0, 62**width) onto itself
+_SCRAMBLE_MULTIPLIER = 0x5DEECE66D
+
+
+def encode_code(value, min_length=CODE_LENGTH):
+    """Encode a non-negative id as a scrambled base62 code."""
+    width = min_length
+    while value >= 62 ** width:
+        width += 1
+    value = (value * _SCRAMBLE_MULTIPLIER) % 62 ** width
+    chars = []
+    for _ in range(width):
+        value, digit = divmod(value, 62)
+        chars.append(BASE62_ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+class IdRangeAllocator:
+    """Hands out unique ids, leasing them from ``counter_file`` in blocks."""
+
+    def __init__(self, counter_file, block_size=1000):
+        self.counter_file = counter_file
+        self.block_size = block_size
+        self._lease_lock = threading.Lock()
+        self._ids = iter(())
+
+    def next_id(self):
+        # next() on a range iterator is atomic under the GIL, so request
+        # threads only contend for _lease_lock when a block runs out.
+        ids = self._ids
+        try:
+            return next(ids)
+        except StopIteration:
+            pass
+        with self._lease_lock:
+            if self._ids is ids:
+                start = self._lease_block()
+                self._ids = iter(range(start, start + self.block_size))
+        return self.next_id()
+
+    def _lease_block(self):
+        os.makedirs(os.path.dirname(self.counter_file) or '.', exist_ok=True)
+        fd = os.open(self.counter_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            data = os.read(fd, 64).strip()
+            start = int(data) if data else 1
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, str(start + self.block_size).encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        logger.info(f"Leased code ids {start}-{start + self.block_size - 1}")
+        return start
+
+
+class CodeAllocator:
+    """
+    Mints collision-free codes for a storage engine and deduplicates URLs.
+
+    The reverse index maps ``hash(url)`` to its code and is verified against
+    the store on every hit. It is filled from the store on a background
+    thread; until that finishes an already-stored URL may get a second code,
+    which is wasteful but never wrong.
+    """
+
+    def __init__(self, store, ids):
+        self.store = store
+        self.ids = ids
+        self._reverse = {}
+        self._lock = threading.Lock()
+        self._warmer = threading.Thread(target=self._build_reverse_index, name='code-reverse-index', daemon=True)
+        self._warmer.start()
+
+    def _build_reverse_index(self):
+        for short_code, url in self.store.items():
+            self._reverse.setdefault(hash(url), short_code)
+        logger.info(f"Reverse index ready: {len(self._reverse)} URLs")
+
+    def shorten(self, url):
+        """Return ``(short_code, created)`` for ``url``, storing it if new."""
+        url_hash = hash(url)
+        with self._lock:
+            short_code = self._reverse.get(url_hash)
+            if short_code is not None and self.store.get(short_code) == url:
+                return short_code, False
+            short_code = self._mint()
+            self._reverse[url_hash] = short_code
+        try:
+            self.store.put(short_code, url)
+        except Exception:
+            # Otherwise a retry would be handed the unsaved code
+            with self._lock:
+                if self._reverse.get(url_hash) == short_code:
+                    del self._reverse[url_hash]
+            raise
+        return short_code, True
+
+    def _mint(self):
+        # Stores created before counter-based codes hold hex hash codes,
+        # which can clash with base62 ones; skip ids whose code is taken.
+        while True:
+            short_code = encode_code(self.ids.next_id())
+            if short_code not in self.store:
+                return short_code
@@ -0,0 +1,216 @@
+"""
+Memory-compact short code -> URL index.
+
+Short codes are 6 ASCII characters (base62 from ``codes.py``, or hex codes
+from older stores), so each one packs losslessly into a 48-bit integer.
+Instead of a dict of str -> str (two Python objects plus a hash entry per
+link), the index keeps:
+
+- an open-addressing hash table of entry numbers (``array('i')``)
+- per-entry packed integer codes, arena offsets and lengths (``array``)
+- every URL's UTF-8 bytes back to back in a single ``bytearray`` arena
+
+With 70-byte URLs, ``benchmarks/bench_index.py`` measures about 105 bytes per
+link (URL included) against about 215 for the dict. Lookups are slower: about
+2us of packing, probing and decoding in Python, against well under 1us for
+a dict hit. Codes that don't fit the fixed-width format are kept in a small
+fallback dict.
+"""
+import itertools
+from array import array
+
+CODE_LENGTH = 6
+EMPTY = -1
+MAX_LOAD_FACTOR = 0.5
+# Fibonacci hashing multiplier; packed codes share their high bits, so the
+# key has to be mixed before its top bits pick a slot
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_HASH_MASK = 0xFFFFFFFFFFFFFFFF
+_HASH_BITS = 64
+
+
+def code_to_key(short_code):
+    """Pack a fixed-width ASCII short code into an int, or None if it doesn't fit."""
+    if len(short_code) != CODE_LENGTH or not short_code.isascii():
+        return None
+    return int.from_bytes(short_code.encode('ascii'), 'big')
+
+
+def key_to_code(key):
+    return key.to_bytes(CODE_LENGTH, 'big').decode('ascii')
+
+
+class CompactURLIndex:
+    """Dict-like mapping of short code -> URL with packed storage."""
+
+    def __init__(self, items=None, capacity=1024):
+        self._capacity = 1
+        while self._capacity < capacity:
+            self._capacity *= 2
+        self._shift = _HASH_BITS - self._capacity.bit_length() + 1
+        self._slots = array('i', [EMPTY]) * self._capacity
+        self._keys = array('Q')
+        self._starts = array('Q')
+        self._lengths = array('I')
+        self._arena = bytearray()
+        self._other = {}
+        if items:
+            for short_code, url in items:
+                self[short_code] = url
+
+    def _slot(self, key):
+        # Linear probing from the hashed position; returns (slot, entry or EMPTY)
+        mask = self._capacity - 1
+        slot = ((key * _HASH_MULTIPLIER) & _HASH_MASK) >> self._shift
+        slots = self._slots
+        keys = self._keys
+        while True:
+            entry = slots[slot]
+            if entry == EMPTY or keys[entry] == key:
+                return slot, entry
+            slot = (slot + 1) & mask
+
+    def get(self, short_code, default=None):
+        # Hot path for redirects: code_to_key() and _slot() are inlined
+        if len(short_code) != CODE_LENGTH or not short_code.isascii():
+            return self._other.get(short_code, default)
+        key = int.from_bytes(short_code.encode('ascii'), 'big')
+
+        mask = self._capacity - 1
+        slot = ((key * _HASH_MULTIPLIER) & _HASH_MASK) >> self._shift
+        slots = self._slots
+        keys = self._keys
+        entry = slots[slot]
+        while entry != EMPTY:
+            if keys[entry] == key:
+                start = self._starts[entry]
+                return self._arena[start:start + self._lengths[entry]].decode('utf-8')
+            slot = (slot + 1) & mask
+            entry = slots[slot]
+        return default
+
+    def __getitem__(self, short_code):
+        url = self.get(short_code)
+        if url is None:
+            raise KeyError(short_code)
+        return url
+
+    def __setitem__(self, short_code, url):
+        key = code_to_key(short_code)
+        if key is None:
+            self._other[short_code] = url
+            return
+
+        data = url.encode('utf-8')
+        slot, entry = self._slot(key)
+        if entry != EMPTY:
+            start = self._starts[entry]
+            if self._arena[start:start + self._lengths[entry]] == data:
+                return
+            # The old bytes stay in the arena until the index is reloaded on
+            # restart; codes.py never reassigns a code, so only direct
+            # overwrites get here.
+            self._starts[entry] = len(self._arena)
+            self._lengths[entry] = len(data)
+            self._arena += data
+            return
+
+        entry = len(self._keys)
+        self._keys.append(key)
+        self._starts.append(len(self._arena))
+        self._lengths.append(len(data))
+        self._arena += data
+        self._slots[slot] = entry
+        if len(self._keys) > self._capacity * MAX_LOAD_FACTOR:
+            self._grow()
+
+    def __delitem__(self, short_code):
+        key = code_to_key(short_code)
+        if key is None:
+            del self._other[short_code]
+            return
+        slot, entry = self._slot(key)
+        if entry == EMPTY:
+            raise KeyError(short_code)
+        self._clear_slot(slot)
+
+        # Entries stay dense: the last one takes over the freed entry number.
+        # Its URL bytes, like those of overwritten URLs, stay in the arena.
+        last = len(self._keys) - 1
+        if entry != last:
+            self._slots[self._slot(self._keys[last])[0]] = entry
+            self._keys[entry] = self._keys[last]
+            self._starts[entry] = self._starts[last]
+            self._lengths[entry] = self._lengths[last]
+        self._keys.pop()
+        self._starts.pop()
+        self._lengths.pop()
+
+    def _clear_slot(self, slot):
+        # Backward-shift deletion: move later entries of the probe run into
+        # the hole when their home slot allows it, so lookups never stop early
+        mask = self._capacity - 1
+        slots = self._slots
+        slots[slot] = EMPTY
+        hole = slot
+        while True:
+            slot = (slot + 1) & mask
+            entry = slots[slot]
+            if entry == EMPTY:
+                return
+            home = ((self._keys[entry] * _HASH_MULTIPLIER) & _HASH_MASK) >> self._shift
+            if (slot - home) & mask >= (slot - hole) & mask:
+                slots[hole] = entry
+                slots[slot] = EMPTY
+                hole = slot
+
+    def _grow(self):
+        self._capacity *= 2
+        self._shift -= 1
+        self._slots = array('i', [EMPTY]) * self._capacity
+        for entry, key in enumerate(self._keys):
+            self._slots[self._slot(key)[0]] = entry
+
+    def __contains__(self, short_code):
+        return self.get(short_code) is not None
+
+    def __len__(self):
+        return len(self._keys) + len(self._other)
+
+    def __iter__(self):
+        for key in self._keys:
+            yield key_to_code(key)
+        yield from self._other
+
+    def items(self):
+        arena = self._arena
+        for key, start, length in zip(self._keys, self._starts, self._lengths):
+            yield key_to_code(key), arena[start:start + length].decode('utf-8')
+        yield from self._other.items()
+
+    def items_from(self, position):
+        """Yield (code, url) pairs in entry order, starting at ``position``."""
+        arena = self._arena
+        for entry in range(position, len(self._keys)):
+            start = self._starts[entry]
+            yield key_to_code(self._keys[entry]), arena[start:start + self._lengths[entry]].decode('utf-8')
+        # Codes outside the fixed-width format are listed after all others
+        skip = max(0, position - len(self._keys))
+        yield from itertools.islice(self._other.items(), skip, None)
+
+    def copy(self):
+        clone = CompactURLIndex.__new__(CompactURLIndex)
+        clone._capacity = self._capacity
+        clone._shift = self._shift
+        clone._slots = array('i', self._slots)
+        clone._keys = array('Q', self._keys)
+        clone._starts = array('Q', self._starts)
+        clone._lengths = array('I', self._lengths)
+        clone._arena = bytearray(self._arena)
+        clone._other = dict(self._other)
+        return clone
+
+    def memory_usage(self):
+        """Approximate bytes held by the packed arrays and the arena."""
+        arrays = (self._slots, self._keys, self._starts, self._lengths)
+        return sum(a.itemsize * len(a) for a in arrays) + len(self._arena)
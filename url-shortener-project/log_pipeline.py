@@ -0,0 +1,120 @@
+"""
+Non-blocking, structured logging.
+
+``setup_logging()`` replaces ``logging.basicConfig()``. Request threads only
+put the ``LogRecord`` on a bounded queue; a ``QueueListener`` thread formats
+it as one JSON object per line and writes it to stderr. On top of the stdlib
+queue handlers:
+
+- formatting is lazy: the message is only built on the listener thread, so
+  callers should pass ``%s`` arguments instead of f-strings
+- records logged with ``extra={'sampled': True}`` (success-path logs) are
+  kept with probability ``LOG_SAMPLE_RATE``; everything else is always kept
+- when the queue is full, records below ERROR are dropped and counted;
+  errors are never dropped: they are written straight to stderr instead
+
+The url-shortener and the datadog sandbox Flask app each ship an identical
+copy of this module; url-shortener-project/tests/test_shared_modules.py
+fails when they drift, so change both together.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+# Attributes every LogRecord has; anything else came from ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'sampled'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single-line JSON object."""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps ``sampled`` records with probability ``rate``."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate >= 1 or not getattr(record, 'sampled', False):
+            return True
+        return random.random() < self.rate
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks on a full queue: records below ERROR are
+    dropped and counted, errors go to ``overflow_handler`` on the calling
+    thread.
+    """
+
+    def __init__(self, log_queue, overflow_handler, dropped_counter=None):
+        super().__init__(log_queue)
+        self.overflow_handler = overflow_handler
+        self.dropped_counter = dropped_counter
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stdlib version formats the message here, on the request
+        # thread; the listener shares this process, so the record can be
+        # passed through as is and formatted there
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if record.levelno >= logging.ERROR:
+            # The handler's lock keeps this from interleaving with the listener
+            self.overflow_handler.handle(record)
+            return
+        self.dropped += 1
+        if self.dropped_counter is not None:
+            self.dropped_counter.increment(record.levelname)
+
+
+def setup_logging(level=LOG_LEVEL, sample_rate=LOG_SAMPLE_RATE, queue_size=LOG_QUEUE_SIZE, dropped_counter=None):
+    """Route the root logger through a queue to a JSON stderr handler."""
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = BoundedQueueHandler(queue.Queue(queue_size), stream_handler, dropped_counter)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return queue_handler
@@ -0,0 +1,158 @@
+"""
+Memory-mapped, read-only redirect table.
+
+The file is queried in place through ``mmap`` so opening it is O(1) no matter
+how many links it holds; pages are loaded lazily by the OS as lookups touch
+them. Layout (all integers little-endian):
+
+    header   magic "URLT", version u16, reserved u16, slot_count u64,
+             entry_count u64, blob_offset u64
+    index    slot_count x (crc32 u32, record_length u32, record_offset u64)
+             open addressing with linear probing; record_length 0 = empty
+    blob     records of: code_length u8, url_length u32, code bytes,
+             URL bytes (UTF-8)
+
+Convert an existing JSON store with:
+
+    python mmap_table.py data/urls.json data/urls.table
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+MAGIC = b'URLT'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQQ')
+SLOT = struct.Struct('<IIQ')
+RECORD = struct.Struct('<BI')
+MAX_LOAD_FACTOR = 0.5
+
+
+class MmapTable:
+    """Read-only view over a table file written by ``write_table()``."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.slot_count, self.entry_count, self.blob_offset = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} redirect table")
+        self._mask = self.slot_count - 1
+
+    def get(self, short_code, default=None):
+        code = short_code.encode('utf-8')
+        code_hash = zlib.crc32(code)
+        slot = code_hash & self._mask
+        mm = self._mm
+        while True:
+            slot_hash, length, offset = SLOT.unpack_from(mm, HEADER.size + slot * SLOT.size)
+            if length == 0:
+                return default
+            if slot_hash == code_hash:
+                code_start = self.blob_offset + offset + RECORD.size
+                code_end = code_start + len(code)
+                if mm[code_start:code_end] == code:
+                    return mm[code_end:self.blob_offset + offset + length].decode('utf-8')
+            slot = (slot + 1) & self._mask
+
+    def __contains__(self, short_code):
+        return self.get(short_code) is not None
+
+    def __len__(self):
+        return self.entry_count
+
+    def items(self):
+        """Yield (code, url) pairs in the order they were written."""
+        mm = self._mm
+        position = self.blob_offset
+        end = len(mm)
+        while position < end:
+            code_length, url_length = RECORD.unpack_from(mm, position)
+            code_start = position + RECORD.size
+            url_start = code_start + code_length
+            position = url_start + url_length
+            yield mm[code_start:url_start].decode('utf-8'), mm[url_start:position].decode('utf-8')
+
+    def scan(self, offset, limit):
+        """
+        Read up to ``limit`` records starting ``offset`` bytes into the blob.
+
+        Returns the (code, url) pairs and the offset of the next record, or
+        None once the end of the table is reached.
+        """
+        mm = self._mm
+        position = self.blob_offset + offset
+        end = len(mm)
+        page = []
+        while position < end and len(page) < limit:
+            code_length, url_length = RECORD.unpack_from(mm, position)
+            code_start = position + RECORD.size
+            url_start = code_start + code_length
+            position = url_start + url_length
+            page.append((mm[code_start:url_start].decode('utf-8'), mm[url_start:position].decode('utf-8')))
+        return page, (position - self.blob_offset if position < end else None)
+
+    def close(self):
+        self._mm.close()
+
+
+def write_table(path, items, count):
+    """
+    Write ``count`` unique (code, url) pairs from ``items`` to a new table.
+
+    The file is written next to ``path`` and renamed into place, so readers
+    holding the old table keep a consistent view.
+    """
+    slot_count = 1
+    while slot_count < max(count, 1) / MAX_LOAD_FACTOR:
+        slot_count *= 2
+    mask = slot_count - 1
+    slots = bytearray(slot_count * SLOT.size)
+    blob_offset = HEADER.size + len(slots)
+
+    tmp_path = path + '.tmp'
+    written = 0
+    with open(tmp_path, 'wb') as f:
+        f.seek(blob_offset)
+        offset = 0
+        for short_code, url in items:
+            code = short_code.encode('utf-8')
+            data = url.encode('utf-8')
+            record = RECORD.pack(len(code), len(data)) + code + data
+            code_hash = zlib.crc32(code)
+            slot = code_hash & mask
+            while SLOT.unpack_from(slots, slot * SLOT.size)[1]:
+                slot = (slot + 1) & mask
+            SLOT.pack_into(slots, slot * SLOT.size, code_hash, len(record), offset)
+            f.write(record)
+            offset += len(record)
+            written += 1
+            if written > count:
+                raise ValueError(f"More than {count} items passed to write_table()")
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, slot_count, written, blob_offset))
+        f.write(slots)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return written
+
+
+def convert_json(json_path, table_path):
+    """Convert a ``{"code": "url"}`` JSON store into a table file."""
+    with open(json_path, 'r') as f:
+        urls = json.load(f)
+    return write_table(table_path, urls.items(), len(urls))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Usage: python mmap_table.py <urls.json> <urls.table>")
+        sys.exit(1)
+    total = convert_json(sys.argv[1], sys.argv[2])
+    print(f"✅ Wrote {total} URLs to {sys.argv[2]}")
@@ -0,0 +1,581 @@
+"""
+Storage engines for the URL shortener.
+
+Every engine maps a short code to its original URL and exposes the same small
+interface (``get``, ``put``, ``items``, ``len``), so ``app.py`` can switch
+between them with the ``STORAGE_BACKEND`` environment variable.
+"""
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+from datadog import statsd
+
+from compact_index import CompactURLIndex
+from mmap_table import MmapTable, convert_json, write_table
+
+logger = logging.getLogger(__name__)
+
+# Compaction settings for the log-structured engine
+COMPACT_INTERVAL_SECONDS = float(os.getenv('COMPACT_INTERVAL_SECONDS', '60'))
+COMPACT_MIN_RECORDS = int(os.getenv('COMPACT_MIN_RECORDS', '10000'))
+
+# In-memory index used by the engines: 'dict' or 'compact' (see compact_index.py)
+URL_INDEX = os.getenv('URL_INDEX', 'dict')
+
+# Group commit settings for the log writer
+#   async - put() returns once the record is queued (fire-and-forget)
+#   flush - put() waits until its batch has been written to the OS
+#   fsync - put() waits until its batch has been fsync'd to disk
+DURABILITY_MODES = ('async', 'flush', 'fsync')
+STORAGE_DURABILITY = os.getenv('STORAGE_DURABILITY', 'flush')
+# Batches form naturally from records queued while the previous write runs;
+# a non-zero interval trades put() latency for larger batches.
+GROUP_COMMIT_MAX_BATCH = int(os.getenv('GROUP_COMMIT_MAX_BATCH', '512'))
+GROUP_COMMIT_INTERVAL_MS = float(os.getenv('GROUP_COMMIT_INTERVAL_MS', '0'))
+
+
+class URLStore:
+    """Interface shared by all storage engines."""
+
+    def get(self, short_code, default=None):
+        raise NotImplementedError
+
+    def put(self, short_code, url):
+        raise NotImplementedError
+
+    def items(self):
+        raise NotImplementedError
+
+    def scan(self, cursor=None, limit=100):
+        """
+        Return up to ``limit`` (code, url) pairs after ``cursor``.
+
+        Also returns the opaque cursor for the next page, or None when the
+        listing is complete. Raises ValueError for a malformed cursor.
+        """
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def __contains__(self, short_code):
+        return self.get(short_code) is not None
+
+    def close(self):
+        pass
+
+
+class JSONFileStore(URLStore):
+    """Original engine: the whole store is rewritten as JSON on every put."""
+
+    def __init__(self, data_file, index=URL_INDEX):
+        self.data_file = data_file
+        self._urls = _new_index(index, _load_snapshot(data_file))
+        self._lock = threading.Lock()
+
+    def get(self, short_code, default=None):
+        return self._urls.get(short_code, default)
+
+    def put(self, short_code, url):
+        with self._lock:
+            previous = self._urls.get(short_code)
+            self._urls[short_code] = url
+            try:
+                os.makedirs(os.path.dirname(self.data_file) or '.', exist_ok=True)
+                with open(self.data_file, 'w') as f:
+                    _dump_items(self._urls.items(), f)
+            except OSError:
+                if previous is None:
+                    del self._urls[short_code]
+                else:
+                    self._urls[short_code] = previous
+                raise
+
+    def items(self):
+        return list(self._urls.items())
+
+    def scan(self, cursor=None, limit=100):
+        with self._lock:
+            return _scan_index(self._urls, cursor, limit)
+
+    def __len__(self):
+        return len(self._urls)
+
+
+class _Batch:
+    """Records written to the log together, and the outcome of that write."""
+
+    def __init__(self):
+        self.records = []
+        self.done = False
+        self.error = None
+
+
+class GroupCommitWriter:
+    """
+    Background writer that coalesces appends into batched log writes.
+
+    Records queued by many request threads while a batch is being written are
+    picked up together by the next batch, so a burst of N puts costs a handful
+    of writes (and fsyncs) instead of N. Each batch reports its own outcome,
+    and a batch that fails is cut off the end of the log again, so its
+    records are not replayed on restart.
+    """
+
+    def __init__(self, path, durability=STORAGE_DURABILITY, max_batch=GROUP_COMMIT_MAX_BATCH,
+                 interval_ms=GROUP_COMMIT_INTERVAL_MS):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode '{durability}'. Available: {', '.join(DURABILITY_MODES)}")
+        self.path = path
+        self.durability = durability
+        self.max_batch = max_batch
+        self.interval = interval_ms / 1000
+
+        self._cond = threading.Condition()
+        self._file_lock = threading.Lock()
+        self._pending = _Batch()
+        self._stopping = False
+
+        # Unbuffered, so a failed write leaves nothing behind to be flushed later
+        self._file = open(path, 'ab', buffering=0)
+        self._thread = threading.Thread(target=self._run, name='url-store-writer', daemon=True)
+        self._thread.start()
+
+    def append(self, record):
+        """Queue a record and return the batch it joined, for ``wait()``."""
+        with self._cond:
+            batch = self._pending
+            batch.records.append(record)
+            if len(batch.records) == 1 or len(batch.records) >= self.max_batch:
+                self._cond.notify_all()
+            return batch
+
+    def wait(self, batch):
+        """Block until ``batch`` is durable according to the durability mode."""
+        if self.durability == 'async':
+            return
+        with self._cond:
+            while not batch.done:
+                self._cond.wait()
+        if batch.error is not None:
+            raise IOError(f"Log write failed: {batch.error}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending.records and not self._stopping:
+                    self._cond.wait()
+                if not self._pending.records:
+                    return
+                # Optionally linger so more concurrent requests can join the batch
+                deadline = time.time() + self.interval
+                while len(self._pending.records) < self.max_batch and not self._stopping:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, _Batch()
+
+            start_time = time.time()
+            try:
+                self._write(batch.records)
+                error = None
+            except Exception as e:
+                logger.error(f"Log write of {len(batch.records)} records failed: {e}")
+                error = e
+            flush_time_ms = (time.time() - start_time) * 1000
+
+            statsd.histogram('url_shortener.storage.batch_size', len(batch.records),
+                             tags=[f'durability:{self.durability}'])
+            statsd.histogram('url_shortener.storage.flush_latency', flush_time_ms,
+                             tags=[f'durability:{self.durability}'])
+
+            with self._cond:
+                batch.error = error
+                batch.done = True
+                self._cond.notify_all()
+
+    def _write(self, records):
+        data = memoryview(''.join(records).encode('utf-8'))
+        with self._file_lock:
+            fd = self._file.fileno()
+            size = os.fstat(fd).st_size
+            try:
+                while data:
+                    data = data[self._file.write(data):]
+                if self.durability == 'fsync':
+                    os.fsync(fd)
+            except Exception:
+                try:
+                    os.ftruncate(fd, size)
+                except OSError as e:
+                    logger.error(f"Could not truncate failed batch from {self.path}: {e}")
+                raise
+
+    def rotate(self, swap):
+        """Close the log, let ``swap()`` move it aside, then reopen ``path``."""
+        with self._file_lock:
+            self._file.close()
+            swap()
+            self._file = open(self.path, 'ab', buffering=0)
+
+    def close(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join()
+        with self._file_lock:
+            self._file.close()
+
+
+class LogStructuredStore(URLStore):
+    """
+    Append-only engine: a JSON snapshot plus a write-ahead log.
+
+    Each put appends one ``["code", "url"]`` line to ``<snapshot>.log`` through
+    a ``GroupCommitWriter``, so the cost of a write no longer depends on the
+    size of the store and bursts share a single write. A background
+    thread periodically folds the log into a fresh snapshot. On startup the
+    snapshot is loaded and the log tail is replayed on top of it.
+    """
+
+    def __init__(self, data_file, compact_interval=COMPACT_INTERVAL_SECONDS,
+                 compact_min_records=COMPACT_MIN_RECORDS, durability=STORAGE_DURABILITY,
+                 index=URL_INDEX):
+        self.data_file = data_file
+        self.log_file = data_file + '.log'
+        # Log being folded into a snapshot; only exists while compaction runs
+        # or if the process died half way through one.
+        self.compacting_file = data_file + '.log.compacting'
+        self.compact_interval = compact_interval
+        self.compact_min_records = compact_min_records
+        self.durability = durability
+
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._log = None
+        self._compactor = None
+        self._log_records = 0
+
+        self.index = index
+        self._urls = self._load_snapshot()
+        replayed = self._replay(self.compacting_file) + self._replay(self.log_file)
+        self._log_records = replayed
+        logger.info(f"Loaded {len(self._urls)} URLs ({replayed} from log)")
+
+    def _load_snapshot(self):
+        return _new_index(self.index, _load_snapshot(self.data_file))
+
+    def _save_snapshot(self, snapshot):
+        _write_snapshot(self.data_file, snapshot)
+
+    def _replay(self, path):
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    short_code, url = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-append is skipped
+                    logger.warning(f"Skipping corrupt log record in {path}")
+                    continue
+                self._apply(short_code, url)
+                count += 1
+        return count
+
+    def _open_log(self):
+        # Opened on the first write so that read-only importers of the app
+        # module (e.g. the Flask debug reloader parent) never compact.
+        os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+        self._log = GroupCommitWriter(self.log_file, durability=self.durability)
+        self._compactor = threading.Thread(target=self._compact_loop, name='url-store-compactor', daemon=True)
+        self._compactor.start()
+
+    def get(self, short_code, default=None):
+        return self._urls.get(short_code, default)
+
+    def put(self, short_code, url):
+        record = json.dumps([short_code, url]) + '\n'
+        with self._lock:
+            if self._log is None:
+                self._open_log()
+            previous = self._urls.get(short_code)
+            self._apply(short_code, url)
+            self._log_records += 1
+            writer = self._log
+            batch = writer.append(record)
+        try:
+            writer.wait(batch)
+        except IOError:
+            # Readers must not see a URL that was never stored; a later put
+            # of the same code is left alone
+            with self._lock:
+                if self._urls.get(short_code) == url:
+                    self._unapply(short_code, previous)
+            raise
+
+    def _apply(self, short_code, url):
+        self._urls[short_code] = url
+
+    def _unapply(self, short_code, previous):
+        if previous is None:
+            del self._urls[short_code]
+        else:
+            self._urls[short_code] = previous
+
+    def items(self):
+        with self._lock:
+            return list(self._urls.items())
+
+    def scan(self, cursor=None, limit=100):
+        with self._lock:
+            return _scan_index(self._urls, cursor, limit)
+
+    def __len__(self):
+        return len(self._urls)
+
+    def _compact_loop(self):
+        while not self._stop.wait(self.compact_interval):
+            if self._log_records >= self.compact_min_records:
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error(f"Compaction failed: {e}")
+
+    def compact(self):
+        """Fold the current log into a new snapshot and start an empty log."""
+        with self._compact_lock:
+            with self._lock:
+                if self._log is None:
+                    return
+                # Records still queued in the writer are already in
+                # self._urls and land in the new log, where replay is harmless.
+                self._log.rotate(self._move_log_aside)
+                self._log_records = 0
+                snapshot = self._urls.copy()
+
+            start_time = time.time()
+            self._save_snapshot(snapshot)
+            os.remove(self.compacting_file)
+            logger.info(f"Compacted {len(snapshot)} URLs in {time.time() - start_time:.3f}s")
+
+    def _move_log_aside(self):
+        # A leftover log from an interrupted compaction is already in
+        # self._urls, so it is safe to drop once the new snapshot lands.
+        if os.path.exists(self.compacting_file):
+            with open(self.compacting_file, 'a') as dst, open(self.log_file, 'r') as src:
+                dst.write(src.read())
+            os.remove(self.log_file)
+        else:
+            os.replace(self.log_file, self.compacting_file)
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+
+class MmapStore(LogStructuredStore):
+    """
+    Log-structured engine whose snapshot is a memory-mapped redirect table.
+
+    Startup maps ``<name>.table`` (see mmap_table.py) instead of parsing the
+    whole JSON snapshot, so it only replays the log tail; lookups fall through
+    from the in-memory tail to the table. Compaction merges the tail into a
+    new table. An existing JSON snapshot is converted on first start. The
+    tail is always a plain dict, so the ``index`` option does not apply.
+    """
+
+    def __init__(self, data_file, **options):
+        self.table_file = os.path.splitext(data_file)[0] + '.table'
+        self._table = None
+        self._tail_new = 0
+        super().__init__(data_file, **options)
+
+    def _load_snapshot(self):
+        if not os.path.exists(self.table_file) and os.path.exists(self.data_file):
+            logger.info(f"Converting {self.data_file} to {self.table_file}")
+            convert_json(self.data_file, self.table_file)
+        if os.path.exists(self.table_file):
+            self._table = MmapTable(self.table_file)
+        # Only the log tail is held in memory
+        return {}
+
+    def _save_snapshot(self, snapshot):
+        table = self._table
+
+        def merged():
+            if table is not None:
+                for short_code, url in table.items():
+                    if short_code not in snapshot:
+                        yield short_code, url
+            yield from snapshot.items()
+
+        count = (len(table) if table is not None else 0) + sum(
+            1 for short_code in snapshot if table is None or short_code not in table)
+        write_table(self.table_file, merged(), count)
+        new_table = MmapTable(self.table_file)
+
+        with self._lock:
+            # The old table is left for the garbage collector to unmap, so a
+            # concurrent get() never reads from a closed mapping.
+            self._table = new_table
+            for short_code, url in snapshot.items():
+                if self._urls.get(short_code) == url:
+                    del self._urls[short_code]
+            self._tail_new = sum(1 for short_code in self._urls if short_code not in new_table)
+
+    def _base(self):
+        return self._table if self._table is not None else {}
+
+    def get(self, short_code, default=None):
+        url = self._urls.get(short_code)
+        if url is not None:
+            return url
+        return self._base().get(short_code, default)
+
+    def _apply(self, short_code, url):
+        if short_code not in self._urls and short_code not in self._base():
+            self._tail_new += 1
+        self._urls[short_code] = url
+
+    def _unapply(self, short_code, previous):
+        super()._unapply(short_code, previous)
+        if previous is None and short_code not in self._base():
+            self._tail_new -= 1
+
+    def items(self):
+        with self._lock:
+            tail = dict(self._urls.items())
+            base = self._base()
+        merged = [(short_code, url) for short_code, url in base.items() if short_code not in tail]
+        return merged + list(tail.items())
+
+    def scan(self, cursor=None, limit=100):
+        # Cursors are 't<blob offset>' while listing the table and
+        # 'o<position>' while listing the in-memory tail. A compaction in
+        # between pages may shift the listing by a few entries.
+        cursor = cursor or 't0'
+        kind, position = cursor[0], int(cursor[1:])
+        if kind not in ('t', 'o') or position < 0:
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+        page = []
+        table = self._table
+        if kind == 't' and table is not None:
+            while position is not None and len(page) < limit:
+                items, position = table.scan(position, limit - len(page))
+                page.extend(item for item in items if item[0] not in self._urls)
+            if position is not None:
+                return page, f't{position}'
+        if kind == 't':
+            position = 0
+
+        with self._lock:
+            tail = list(itertools.islice(self._urls.items(), position, position + limit - len(page)))
+            position += len(tail)
+            more = position < len(self._urls)
+        page.extend(tail)
+        return page, (f'o{position}' if more else None)
+
+    def __len__(self):
+        return len(self._base()) + self._tail_new
+
+
+def _load_snapshot(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except ValueError as e:
+        logger.error(f"Could not read snapshot {path}: {e}")
+        return {}
+
+
+class OrderedURLIndex(dict):
+    """Dict index that also keeps codes in a list, so listings can resume at a position."""
+
+    def __init__(self, urls=()):
+        super().__init__(urls)
+        self._codes = list(self)
+
+    def __setitem__(self, short_code, url):
+        if short_code not in self:
+            self._codes.append(short_code)
+        super().__setitem__(short_code, url)
+
+    def __delitem__(self, short_code):
+        # Only used to undo a failed put, so the linear remove is fine
+        super().__delitem__(short_code)
+        self._codes.remove(short_code)
+
+    def items_from(self, position):
+        codes = self._codes
+        for i in range(position, len(codes)):
+            yield codes[i], self[codes[i]]
+
+
+def _scan_index(index, cursor, limit):
+    position = int(cursor) if cursor else 0
+    if position < 0:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    page = list(itertools.islice(index.items_from(position), limit))
+    position += len(page)
+    return page, (str(position) if position < len(index) else None)
+
+
+def _new_index(kind, urls):
+    if kind == 'dict':
+        return OrderedURLIndex(urls)
+    if kind == 'compact':
+        return CompactURLIndex(urls.items(), capacity=2 * len(urls))
+    raise ValueError(f"Unknown URL index '{kind}'. Available: dict, compact")
+
+
+def _dump_items(items, f):
+    # Streams a JSON object without building a dict of the whole store
+    f.write('{')
+    for i, (short_code, url) in enumerate(items):
+        if i:
+            f.write(', ')
+        f.write(json.dumps(short_code))
+        f.write(': ')
+        f.write(json.dumps(url))
+    f.write('}')
+
+
+def _write_snapshot(path, urls):
+    """Write a snapshot atomically: readers see the old file or the new one."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        _dump_items(urls.items(), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+STORAGE_BACKENDS = {
+    'json': JSONFileStore,
+    'log': LogStructuredStore,
+    'mmap': MmapStore,
+}
+
+
+def create_store(backend, data_file, **options):
+    """Build the storage engine registered under ``backend``."""
+    try:
+        store_class = STORAGE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown storage backend '{backend}'. Available: {', '.join(STORAGE_BACKENDS)}")
+    return store_class(data_file, **options)
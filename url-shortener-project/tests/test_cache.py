@@ -0,0 +1,64 @@
+import time
+
+from cache import RedirectCache
+
+
+def lookup(cache, code):
+    # What app.lookup_url() does on top of a store
+    url = cache.get(code)
+    if url is None:
+        url = f'https://example.com/{code}'
+        cache.put(code, url)
+    return url
+
+
+def test_size_stays_bounded():
+    cache = RedirectCache(100)
+    for i in range(1000):
+        lookup(cache, f'c{i}')
+    assert len(cache) <= 100
+    assert cache.evictions == 900
+    assert cache.misses == 1000
+
+
+def test_popular_links_survive_a_scan():
+    cache = RedirectCache(100)
+    hot = [f'hot{i}' for i in range(50)]
+    for _ in range(5):
+        for code in hot:
+            lookup(cache, code)
+
+    # One-off codes keep missing but are not admitted over the hot ones,
+    # which are still being requested in between
+    for i in range(5000):
+        lookup(cache, f'once{i}')
+        if i % 10 == 0:
+            lookup(cache, hot[i // 10 % len(hot)])
+
+    hits = cache.hits
+    for code in hot:
+        assert lookup(cache, code) == f'https://example.com/{code}'
+    assert cache.hits - hits == len(hot)
+
+
+def test_frequent_newcomer_is_admitted():
+    cache = RedirectCache(100)
+    for i in range(100):
+        lookup(cache, f'cold{i}')
+    for _ in range(10):
+        lookup(cache, 'rising')
+        lookup(cache, 'filler')
+    assert cache.get('rising') == 'https://example.com/rising'
+
+
+def test_ttl_and_invalidate():
+    cache = RedirectCache(10, ttl_seconds=0.05)
+    cache.put('a', 'https://example.com/a')
+    cache.put('b', 'https://example.com/b')
+    assert cache.get('a') == 'https://example.com/a'
+    cache.invalidate('a')
+    assert cache.get('a') is None
+
+    time.sleep(0.06)
+    assert cache.get('b') is None
+    assert len(cache) == 0
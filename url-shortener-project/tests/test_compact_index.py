@@ -0,0 +1,32 @@
+from compact_index import CompactURLIndex
+
+
+def test_grows_past_initial_capacity():
+    index = CompactURLIndex(capacity=4)
+    for i in range(1000):
+        index[f'c{i:05d}'] = f'https://example.com/{i}'
+    assert len(index) == 1000
+    assert all(index.get(f'c{i:05d}') == f'https://example.com/{i}' for i in range(1000))
+    assert index.get('zzzzzz') is None
+
+
+def test_overwrite_and_fallback_codes():
+    index = CompactURLIndex()
+    index['abc123'] = 'https://example.com/a'
+    index['abc123'] = 'https://example.com/b'
+    index['not-six-chars'] = 'https://example.com/c'
+    assert index['abc123'] == 'https://example.com/b'
+    assert index['not-six-chars'] == 'https://example.com/c'
+    assert len(index) == 2
+    assert dict(index.items()) == {'abc123': 'https://example.com/b', 'not-six-chars': 'https://example.com/c'}
+
+
+def test_items_from_and_copy():
+    index = CompactURLIndex([(f'c{i:05d}', f'https://example.com/{i}') for i in range(5)])
+    index['long-code'] = 'https://example.com/long'
+    assert [code for code, _ in index.items_from(3)] == ['c00003', 'c00004', 'long-code']
+
+    clone = index.copy()
+    clone['c00000'] = 'https://example.com/changed'
+    assert index['c00000'] == 'https://example.com/0'
+    assert clone['c00000'] == 'https://example.com/changed'
@@ -0,0 +1,74 @@
+import pytest
+
+from mmap_table import MAX_LOAD_FACTOR, MmapTable, convert_json, write_table
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'urls.table')
+    items = [(f'code{i:03d}', f'https://example.com/{i}/ü') for i in range(300)]
+    assert write_table(path, iter(items), len(items)) == 300
+
+    table = MmapTable(path)
+    assert len(table) == 300
+    assert table.slot_count >= 300 / MAX_LOAD_FACTOR
+    assert all(table.get(code) == url for code, url in items)
+    assert table.get('missing') is None
+    assert 'code000' in table
+    assert list(table.items()) == items
+    table.close()
+
+
+def test_scan_resumes_from_offset(tmp_path):
+    path = str(tmp_path / 'urls.table')
+    items = [(f'c{i}', f'https://example.com/{i}') for i in range(10)]
+    write_table(path, items, len(items))
+
+    table = MmapTable(path)
+    seen, offset = [], 0
+    while offset is not None:
+        page, offset = table.scan(offset, 3)
+        seen.extend(page)
+    assert seen == items
+    table.close()
+
+
+def test_rewrite_keeps_old_mapping_readable(tmp_path):
+    path = str(tmp_path / 'urls.table')
+    write_table(path, [('a', 'https://example.com/a')], 1)
+    old = MmapTable(path)
+
+    items = [(f'c{i}', f'https://example.com/{i}') for i in range(100)]
+    write_table(path, items, len(items))
+    new = MmapTable(path)
+    assert old.get('a') == 'https://example.com/a'
+    assert new.get('a') is None
+    assert new.slot_count > old.slot_count
+    assert new.get('c99') == 'https://example.com/99'
+
+
+def test_empty_table(tmp_path):
+    path = str(tmp_path / 'urls.table')
+    write_table(path, [], 0)
+    table = MmapTable(path)
+    assert len(table) == 0
+    assert table.get('a') is None
+    assert table.scan(0, 10) == ([], None)
+
+
+def test_too_many_items(tmp_path):
+    with pytest.raises(ValueError):
+        write_table(str(tmp_path / 'urls.table'), [('a', 'x'), ('b', 'y')], 1)
+
+
+def test_not_a_table(tmp_path):
+    path = tmp_path / 'urls.table'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        MmapTable(str(path))
+
+
+def test_convert_json(tmp_path):
+    json_path = tmp_path / 'urls.json'
+    json_path.write_text('{"abc123": "https://example.com/a"}')
+    assert convert_json(str(json_path), str(tmp_path / 'urls.table')) == 1
+    assert MmapTable(str(tmp_path / 'urls.table')).get('abc123') == 'https://example.com/a'
@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+PROJECT_ROOT = os.path.join(os.path.dirname(__file__), '..')
+SANDBOX_APP = os.path.join(PROJECT_ROOT, '..', 'datadog-sandbox-project', 'flask-app')
+
+# Modules both apps ship; each Docker build context needs its own copy
+SHARED_MODULES = ['metrics.py', 'log_pipeline.py']
+
+
+@pytest.mark.parametrize('module', SHARED_MODULES)
+def test_copies_are_identical(module):
+    sandbox_copy = os.path.join(SANDBOX_APP, module)
+    if not os.path.exists(sandbox_copy):
+        pytest.skip('datadog-sandbox-project is not checked out next to this project')
+    with open(os.path.join(PROJECT_ROOT, module), 'rb') as ours, open(sandbox_copy, 'rb') as theirs:
+        assert ours.read() == theirs.read(), f"{module} differs from {sandbox_copy}; apply the change to both"
@@ -0,0 +1,234 @@
+import errno
+import json
+import os
+import threading
+
+import pytest
+
+import storage
+from codes import CodeAllocator, IdRangeAllocator
+from mmap_table import MmapTable
+from storage import create_store
+
+# Compaction only runs when a test calls compact()
+NO_BACKGROUND_COMPACTION = {'compact_interval': 3600}
+
+STORES = [
+    pytest.param('log', {'index': 'dict'}, id='log-dict'),
+    pytest.param('log', {'index': 'compact'}, id='log-compact'),
+    pytest.param('mmap', {}, id='mmap'),
+]
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    return str(tmp_path / 'urls.json')
+
+
+def open_store(backend, data_file, options):
+    return create_store(backend, data_file, **NO_BACKGROUND_COMPACTION, **options)
+
+
+@pytest.mark.parametrize('backend, options', STORES)
+def test_reload_after_restart(backend, options, data_file):
+    store = open_store(backend, data_file, options)
+    store.put('abc123', 'https://example.com/a')
+    store.put('abc124', 'https://example.com/b')
+    store.close()
+
+    store = open_store(backend, data_file, options)
+    assert store.get('abc123') == 'https://example.com/a'
+    assert store.get('abc124') == 'https://example.com/b'
+    assert store.get('zzzzzz') is None
+    assert len(store) == 2
+    store.close()
+
+
+@pytest.mark.parametrize('backend, options', STORES)
+def test_compaction_then_restart(backend, options, data_file):
+    store = open_store(backend, data_file, options)
+    for i in range(50):
+        store.put(f'code{i:02d}', f'https://example.com/{i}')
+    store.compact()
+
+    assert not os.path.exists(store.compacting_file)
+    assert os.path.getsize(store.log_file) == 0
+    for i in range(50, 60):
+        store.put(f'code{i:02d}', f'https://example.com/{i}')
+    assert len(store) == 60
+    store.close()
+
+    store = open_store(backend, data_file, options)
+    assert len(store) == 60
+    assert dict(store.items()) == {f'code{i:02d}': f'https://example.com/{i}' for i in range(60)}
+    store.close()
+
+
+@pytest.mark.parametrize('backend, options', STORES)
+def test_interrupted_compaction_is_replayed_and_folded(backend, options, data_file):
+    store = open_store(backend, data_file, options)
+    store.put('aaaaaa', 'https://example.com/a')
+    store.close()
+    # Crash after the log was rotated aside but before the snapshot landed
+    os.replace(data_file + '.log', data_file + '.log.compacting')
+
+    store = open_store(backend, data_file, options)
+    assert store.get('aaaaaa') == 'https://example.com/a'
+    store.put('bbbbbb', 'https://example.com/b')
+    store.compact()
+    assert not os.path.exists(store.compacting_file)
+    store.close()
+
+    store = open_store(backend, data_file, options)
+    assert store.get('aaaaaa') == 'https://example.com/a'
+    assert store.get('bbbbbb') == 'https://example.com/b'
+    store.close()
+
+
+@pytest.mark.parametrize('backend, options', STORES)
+def test_torn_log_record_is_skipped(backend, options, data_file):
+    store = open_store(backend, data_file, options)
+    store.put('aaaaaa', 'https://example.com/a')
+    store.close()
+    with open(data_file + '.log', 'a') as f:
+        f.write('["bbbbbb", "https://exa')
+
+    store = open_store(backend, data_file, options)
+    assert store.get('aaaaaa') == 'https://example.com/a'
+    assert store.get('bbbbbb') is None
+    store.close()
+
+
+@pytest.mark.parametrize('backend, options', STORES)
+def test_scan_pages_through_everything(backend, options, data_file):
+    store = open_store(backend, data_file, options)
+    for i in range(25):
+        store.put(f'code{i:02d}', f'https://example.com/{i}')
+    store.compact()
+    for i in range(25, 40):
+        store.put(f'code{i:02d}', f'https://example.com/{i}')
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.scan(cursor, limit=7)
+        seen.extend(page)
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(store.items())
+    assert len(seen) == 40
+    store.close()
+
+
+def test_mmap_store_converts_json_snapshot(data_file):
+    with open(data_file, 'w') as f:
+        json.dump({'abc123': 'https://example.com/a'}, f)
+
+    store = open_store('mmap', data_file, {})
+    assert os.path.exists(store.table_file)
+    assert store.get('abc123') == 'https://example.com/a'
+    store.close()
+
+
+def test_mmap_store_table_grows_across_compactions(data_file):
+    store = open_store('mmap', data_file, {})
+    store.put('code000', 'https://example.com/0')
+    store.compact()
+    first_slots = MmapTable(store.table_file).slot_count
+
+    for i in range(1, 500):
+        store.put(f'code{i:03d}', f'https://example.com/{i}')
+    store.compact()
+    table = MmapTable(store.table_file)
+    assert table.slot_count > first_slots
+    assert len(table) == len(store) == 500
+    # The tail only keeps what the table does not hold yet
+    store.put('code000', 'https://example.com/changed')
+    assert store.get('code000') == 'https://example.com/changed'
+    assert len(store) == 500
+    store.close()
+
+    store = open_store('mmap', data_file, {})
+    assert store.get('code000') == 'https://example.com/changed'
+    assert store.get('code499') == 'https://example.com/499'
+    assert len(store) == 500
+    store.close()
+
+
+def test_unknown_backend(data_file):
+    with pytest.raises(ValueError):
+        create_store('nope', data_file)
+
+
+class FailFirstFsync:
+    """Stand-in for os.fsync whose first call blocks until released, then fails."""
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def __call__(self, fd):
+        self.calls += 1
+        if self.calls == 1:
+            self.entered.set()
+            self.release.wait(5)
+            raise OSError(errno.EIO, 'injected fsync failure')
+
+
+def test_failed_batch_is_reported_after_a_later_batch_succeeds(tmp_path, monkeypatch):
+    fsync = FailFirstFsync()
+    monkeypatch.setattr(storage.os, 'fsync', fsync)
+    path = str(tmp_path / 'urls.json.log')
+    writer = storage.GroupCommitWriter(path, durability='fsync')
+
+    failed = writer.append('["aaaaaa", "https://example.com/a"]\n')
+    fsync.entered.wait(5)
+    written = writer.append('["bbbbbb", "https://example.com/b"]\n')
+    fsync.release.set()
+
+    writer.wait(written)
+    with pytest.raises(IOError):
+        writer.wait(failed)
+    writer.close()
+    # The failed batch was cut off the log, so it is not replayed
+    with open(path) as f:
+        assert f.read() == '["bbbbbb", "https://example.com/b"]\n'
+
+
+@pytest.mark.parametrize('backend, options', STORES)
+def test_failed_put_is_undone(backend, options, data_file, monkeypatch):
+    fsync = FailFirstFsync()
+    fsync.release.set()
+    monkeypatch.setattr(storage.os, 'fsync', fsync)
+    store = open_store(backend, data_file, dict(options, durability='fsync'))
+    allocator = CodeAllocator(store, IdRangeAllocator(data_file + '.counter'))
+    allocator._warmer.join()
+
+    with pytest.raises(IOError):
+        allocator.shorten('https://example.com/a')
+    assert len(store) == 0
+    assert store.items() == []
+
+    # The retry is stored under a fresh code instead of the unsaved one
+    short_code, created = allocator.shorten('https://example.com/a')
+    assert created
+    assert store.get(short_code) == 'https://example.com/a'
+    assert len(store) == 1
+    store.close()
+
+    store = open_store(backend, data_file, options)
+    assert store.items() == [(short_code, 'https://example.com/a')]
+    store.close()
+
+
+def test_failed_put_restores_previous_url(data_file, monkeypatch):
+    store = open_store('log', data_file, {'durability': 'fsync'})
+    store.put('aaaaaa', 'https://example.com/old')
+    fsync = FailFirstFsync()
+    fsync.release.set()
+    monkeypatch.setattr(storage.os, 'fsync', fsync)
+
+    with pytest.raises(IOError):
+        store.put('aaaaaa', 'https://example.com/new')
+    assert store.get('aaaaaa') == 'https://example.com/old'
+    store.close()